@@ -0,0 +1,269 @@
+""" Benchmarks the handlers of resourcereservation against the App Engine testbed, offline.
+
+Synthetic datasets of resources, reservations and users are seeded into the datastore stub at each of the
+requested scales, and the WSGI application is driven directly with webapp2 requests. For every endpoint the
+latency percentiles, the number of API calls per service and the memory of the process are recorded, and
+the results are written as JSON so that runs can be compared with --baseline.
+
+Usage:
+    python benchmark.py --sdk /path/to/google_appengine [--scales small,medium] [--iterations 20]
+                        [--output results.json] [--baseline previous.json]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+
+from datetime import timedelta
+from resource import getrusage, RUSAGE_SELF
+
+SCALES = {
+    'small': {'resources': 20, 'reservations': 200, 'users': 10},
+    'medium': {'resources': 100, 'reservations': 2000, 'users': 50},
+    'large': {'resources': 500, 'reservations': 10000, 'users': 200}
+}
+RESOURCE_NAME_WORDS = ('Meeting', 'Room', 'Lab', 'Projector', 'Court', 'Studio', 'Desk', 'Hall', 'Booth', 'Van')
+RESOURCE_TAGS = ('audio', 'video', 'outdoor', 'quiet', 'large', 'small', 'accessible', 'kitchen')
+RESERVATION_DAYS = 14
+PERCENTILES = (50, 90, 99)
+
+def configureAppEngineSdk(sdkPath):
+    """ Puts the App Engine SDK and the libraries bundled with it on the import path """
+    if sdkPath:
+        sys.path.insert(0, sdkPath)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+def activateTestbed():
+    """ Activates the service stubs used by the application, with a strongly consistent datastore """
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import testbed
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub(consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    bed.init_memcache_stub()
+    bed.init_taskqueue_stub(root_path=os.path.dirname(os.path.abspath(__file__)))
+    bed.init_mail_stub()
+    bed.init_user_stub()
+    bed.init_app_identity_stub()
+    return bed
+
+def signIn(bed, userID):
+    """ Makes the following requests come from the user with the requested userID, who is an administrator """
+    bed.setup_env(USER_EMAIL=userID + '@example.com', USER_ID=userID, USER_IS_ADMIN='1', overwrite=True)
+
+class ApiCallCounter(object):
+    """ Counts the API calls made through the API proxy by service and by method """
+
+    def __init__(self):
+        self.calls = {}
+
+    def __call__(self, service, call, request, response):
+        """ Records one API call; registered as a pre-call hook of the API proxy """
+        key = service + '.' + call
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def install(self):
+        """ Registers the counter with the API proxy """
+        from google.appengine.api import apiproxy_stub_map
+        apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('benchmarkCounter', self)
+
+    def reset(self):
+        """ Clears the recorded calls """
+        self.calls = {}
+
+def seedDataset(scale, randomGenerator):
+    """ Stores the resources, reservations and reservation reminders of a synthetic dataset of the requested scale
+    and returns the IDs of its users and resources """
+    import resourcereservation as app
+    from google.appengine.api import users
+    from google.appengine.ext import ndb
+
+    size = SCALES[scale]
+    userIDs = ['user' + str(index) for index in range(size['users'])]
+    resources = []
+    for index in range(size['resources']):
+        resourceID = '%032x' % randomGenerator.getrandbits(128)
+        resource = app.Resource(key=ndb.Key(app.Resource, resourceID))
+        resource.id = resourceID
+        resource.resourceName = ' '.join(randomGenerator.sample(RESOURCE_NAME_WORDS, 2)) + ' ' + str(index)
+        resource.ownerID = randomGenerator.choice(userIDs)
+        resource.availableStartTime = '8:00'
+        resource.availableEndTime = '20:00'
+        resource.tags = randomGenerator.sample(RESOURCE_TAGS, 2)
+        resource.capacity = randomGenerator.randint(1, 3)
+        resources.append(resource)
+    ndb.put_multi(resources)
+
+    today = app.getCurrentDateTime().date()
+    reservations = []
+    for index in range(size['reservations']):
+        userID = randomGenerator.choice(userIDs)
+        user = users.User(userID + '@example.com', _user_id=userID)
+        reservationDate = str(today + timedelta(days = randomGenerator.randrange(RESERVATION_DAYS)))
+        startMinutes = randomGenerator.randrange(8*60, 18*60, 15)
+        durationMinutes = randomGenerator.choice((30, 60, 90, 120))
+        reservations.append(app.buildReservation(randomGenerator.choice(resources), user, reservationDate,
+                                                 [str(startMinutes//60), str(startMinutes%60)],
+                                                 [str(durationMinutes//60), str(durationMinutes%60)]))
+    ndb.put_multi(reservations)
+    app.createReservationReminders(reservations)
+    return userIDs, [resource.id for resource in resources], reservations
+
+def prepareReminderDispatch(reservations, randomGenerator):
+    """ Files a reminder for every minute of the past hour and rewinds the reminder dispatcher by an hour, so that each
+    run of SendMailViaCron dispatches the same amount of reminders """
+    import resourcereservation as app
+    from google.appengine.ext import ndb
+
+    currentMinute = app.getCurrentDateTime().replace(second=0, microsecond=0)
+    reminders = []
+    for minutesAgo in range(app.MAXIMUM_REMINDER_CATCH_UP_MINUTES):
+        reservation = randomGenerator.choice(reservations)
+        reminders.append(app.ReservationReminder(key=ndb.Key(app.ReservationReminder, reservation.reservationID + ':' + str(minutesAgo),
+                                                             parent=reservation.key.parent()),
+                                                 reservationKey=reservation.key, dueMinute=currentMinute - timedelta(minutes = minutesAgo)))
+    ndb.put_multi(reminders)
+    app.ReminderDispatcherState(key=ndb.Key(app.ReminderDispatcherState, app.REMINDER_DISPATCHER_ID),
+                                lastDispatchedMinute=currentMinute - timedelta(minutes = app.MAXIMUM_REMINDER_CATCH_UP_MINUTES)).put()
+
+def sendRequest(path, parameters=None):
+    """ Sends a GET request, or a POST request if parameters are given, to the WSGI application """
+    import webapp2
+    import resourcereservation as app
+    request = webapp2.Request.blank(path, POST=parameters) if parameters is not None else webapp2.Request.blank(path)
+    response = request.get_response(app.application)
+    if response.status_int >= 400:
+        raise RuntimeError(path + " returned " + response.status)
+
+def getBenchmarkedEndpoints(resourceIDs, reservations, randomGenerator):
+    """ Returns the name, the preparation step run before every timed run, and the timed run of each benchmarked endpoint """
+    import resourcereservation as app
+    tomorrow = str(app.getCurrentDateTime().date() + timedelta(days = 1))
+    noPreparation = lambda: None
+    return [
+        ('hasResourceReachedCapacity', noPreparation,
+         lambda: app.hasResourceReachedCapacity(randomGenerator.choice(resourceIDs), tomorrow, '10:00', '11:00', 1)),
+        ('SearchByAvailability.post', noPreparation,
+         lambda: sendRequest('/searchByAvailability', {'reservationDate': tomorrow, 'startTime': '10:00', 'duration': '1:00'})),
+        ('LandingPage.get', noPreparation, lambda: sendRequest('/')),
+        ('SendMailViaCron.get', lambda: prepareReminderDispatch(reservations, randomGenerator), lambda: sendRequest('/sendMailViaCron'))
+    ]
+
+def benchmarkEndpoint(prepare, run, iterations, counter, coldCache):
+    """ Runs an endpoint the requested number of times and returns its latency, API call and memory measurements """
+    from google.appengine.api import memcache
+    from google.appengine.ext import ndb
+    import resourcereservation as app
+
+    latencies = []
+    callTotals = {}
+    gc.collect()
+    memoryBefore = getrusage(RUSAGE_SELF).ru_maxrss
+    for iteration in range(iterations):
+        prepare()
+        ndb.get_context().clear_cache()
+        if coldCache:
+            memcache.flush_all()
+        counter.reset()
+        startTime = time.time()
+        run()
+        latencies.append((time.time() - startTime) * 1000)
+        for key, count in counter.calls.items():
+            callTotals[key] = callTotals.get(key, 0) + count
+    memoryAfter = getrusage(RUSAGE_SELF).ru_maxrss
+
+    latencies.sort()
+    latencySummary = dict(('p' + str(percentile), round(app.calculatePercentile(latencies, percentile), 3)) for percentile in PERCENTILES)
+    latencySummary['mean'] = round(sum(latencies) / len(latencies), 3)
+    latencySummary['max'] = round(latencies[-1], 3)
+    return {
+        'iterations': iterations,
+        'latencyMilliseconds': latencySummary,
+        'apiCallsPerRequest': dict((key, round(float(total) / iterations, 2)) for key, total in sorted(callTotals.items())),
+        'datastoreCallsPerRequest': round(float(sum(total for key, total in callTotals.items()
+                                                    if key.startswith('datastore_v3.'))) / iterations, 2),
+        'peakMemoryKilobytes': memoryAfter,
+        'memoryGrowthKilobytes': memoryAfter - memoryBefore
+    }
+
+def runBenchmarks(scales, iterations, coldCache, seed):
+    """ Seeds a fresh datastore for each scale and benchmarks every endpoint against it """
+    results = []
+    for scale in scales:
+        bed = activateTestbed()
+        try:
+            counter = ApiCallCounter()
+            counter.install()
+            randomGenerator = random.Random(seed)
+            userIDs, resourceIDs, reservations = seedDataset(scale, randomGenerator)
+            signIn(bed, userIDs[0])
+            for endpoint, prepare, run in getBenchmarkedEndpoints(resourceIDs, reservations, randomGenerator):
+                result = benchmarkEndpoint(prepare, run, iterations, counter, coldCache)
+                result.update({'scale': scale, 'endpoint': endpoint})
+                result.update(SCALES[scale])
+                results.append(result)
+                sys.stderr.write(scale + " " + endpoint + ": p50 " + str(result['latencyMilliseconds']['p50']) + " ms\n")
+        finally:
+            bed.deactivate()
+    return results
+
+def compareWithBaseline(results, baseline):
+    """ Returns the ratio of the median latency and datastore calls of each endpoint to those of a baseline run """
+    baselineResults = dict(((result['scale'], result['endpoint']), result) for result in baseline['results'])
+    comparisons = []
+    for result in results:
+        baselineResult = baselineResults.get((result['scale'], result['endpoint']))
+        if baselineResult is None:
+            continue
+        baselineLatency = baselineResult['latencyMilliseconds']['p50']
+        baselineCalls = baselineResult['datastoreCallsPerRequest']
+        comparisons.append({
+            'scale': result['scale'],
+            'endpoint': result['endpoint'],
+            'p50Ratio': round(result['latencyMilliseconds']['p50'] / baselineLatency, 3) if baselineLatency else None,
+            'datastoreCallsRatio': round(result['datastoreCallsPerRequest'] / baselineCalls, 3) if baselineCalls else None
+        })
+    return comparisons
+
+def main():
+    """ Parses the command line, runs the benchmarks and writes the results as JSON """
+    parser = argparse.ArgumentParser(description="Benchmarks resourcereservation against the App Engine testbed")
+    parser.add_argument('--sdk', default=os.environ.get('APPENGINE_SDK'), help="path of the google_appengine SDK directory")
+    parser.add_argument('--scales', default='small,medium', help="comma separated scales among " + ', '.join(sorted(SCALES)))
+    parser.add_argument('--iterations', type=int, default=20, help="timed runs of each endpoint per scale")
+    parser.add_argument('--cold', action='store_true', help="flush memcache before every timed run")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic datasets")
+    parser.add_argument('--output', help="file to write the results to, instead of standard output")
+    parser.add_argument('--baseline', help="results of a previous run to compare with")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    configureAppEngineSdk(arguments.sdk)
+    scales = arguments.scales.split(',')
+    results = runBenchmarks(scales, arguments.iterations, arguments.cold, arguments.seed)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': int(time.time()),
+        'parameters': {'scales': scales, 'iterations': arguments.iterations, 'cold': arguments.cold, 'seed': arguments.seed},
+        'results': results
+    }
+    if arguments.baseline:
+        with open(arguments.baseline) as baselineFile:
+            report['comparison'] = compareWithBaseline(results, json.load(baselineFile))
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            outputFile.write(output)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import bisect
+
+def intervalsOverlap(firstStart, firstEnd, secondStart, secondEnd):
+    """ Checks if two intervals of minutes [start, end) overlap. Intervals starting at the same minute
+    always overlap, even if one of them is empty """
+    return firstStart == secondStart or (firstStart < secondEnd and secondStart < firstEnd)
+
+class IntervalIndex(object):
+    """ Index of intervals of minutes [start, end), each carrying a value such as the reservation it belongs to,
+    that finds the intervals overlapping a query interval with a binary search. The intervals are kept sorted by
+    start along with the running maximum of their ends, so the intervals that could overlap a query are the
+    contiguous run between the first one whose running maximum end passes the query start and the last one
+    starting at or before the query end """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda interval: interval[:2])
+        self.starts = [start for start, end, value in self.intervals]
+        self.maximumEnds = []
+        for start, end, value in self.intervals:
+            self.maximumEnds.append(max(end, self.maximumEnds[-1]) if self.maximumEnds else end)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, start, end, value=None):
+        """ Adds an interval to the index """
+        position = bisect.bisect_right(self.starts, start)
+        self.intervals.insert(position, (start, end, value))
+        self.starts.insert(position, start)
+        self.maximumEnds.insert(position, max(end, self.maximumEnds[position - 1]) if position else end)
+        for index in range(position + 1, len(self.maximumEnds)):
+            if self.maximumEnds[index] >= self.maximumEnds[index - 1]:
+                break
+            self.maximumEnds[index] = self.maximumEnds[index - 1]
+
+    def findOverlapping(self, start, end):
+        """ Returns the values of the intervals overlapping [start, end), as defined by intervalsOverlap, sorted by start """
+        firstCandidate = min(bisect.bisect_right(self.maximumEnds, start), bisect.bisect_left(self.starts, start))
+        lastCandidate = max(bisect.bisect_left(self.starts, end), bisect.bisect_right(self.starts, start))
+        return [value for intervalStart, intervalEnd, value in self.intervals[firstCandidate:lastCandidate]
+                if intervalsOverlap(intervalStart, intervalEnd, start, end)]
+
+    def overlaps(self, start, end):
+        """ Checks if any interval of the index overlaps [start, end) """
+        return bool(self.findOverlapping(start, end))
+
+def buildIntervalIndexes(keyedIntervals):
+    """ Returns a dictionary of each key, such as a date, to an IntervalIndex of its (key, start, end, value) intervals """
+    intervalsByKey = {}
+    for key, start, end, value in keyedIntervals:
+        intervalsByKey.setdefault(key, []).append((start, end, value))
+    return dict((key, IntervalIndex(intervals)) for key, intervals in intervalsByKey.items())
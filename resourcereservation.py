@@ -1,20 +1,104 @@
 import os
+import re
+import json
+import time
 import uuid
+import urllib
+import hashlib
+import calendar
+import bisect
 import logging
+import threading
+import collections
 import jinja2
 import webapp2
 
 from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_tz, mktime_tz
 from google.appengine.api import users
 from google.appengine.ext import ndb
 from google.appengine.api import mail
 from google.appengine.api import images
+from google.appengine.api import taskqueue
+from google.appengine.api import memcache
+from google.appengine.api import apiproxy_stub_map
+from intervals import IntervalIndex, buildIntervalIndexes
+
+class InstrumentedTemplate(jinja2.Template):
+    
+    def render(self, *args, **kwargs):
+        """ Renders the template and records the rendering time in the statistics of the current request """
+        isOutermost = startTemplateRendering()
+        startTime = time.time()
+        try:
+            return super(InstrumentedTemplate, self).render(*args, **kwargs)
+        finally:
+            finishTemplateRendering(time.time() - startTime, isOutermost)
+    
+    def generate(self, *args, **kwargs):
+        """ Renders the template chunk by chunk and records the time spent rendering, excluding the time 
+        spent by the caller between chunks, in the statistics of the current request """
+        chunks = super(InstrumentedTemplate, self).generate(*args, **kwargs)
+        try:
+            while True:
+                isOutermost = startTemplateRendering()
+                startTime = time.time()
+                try:
+                    chunk = next(chunks)
+                finally:
+                    finishTemplateRendering(time.time() - startTime, isOutermost)
+                yield chunk
+        except StopIteration:
+            pass
 
 JINJA_ENVIRONMENT = jinja2.Environment(
     loader=jinja2.FileSystemLoader(os.path.dirname(__file__)),
     extensions=['jinja2.ext.autoescape'],
-    autoescape=True)
+    autoescape=True,
+    bytecode_cache=jinja2.MemcachedBytecodeCache(memcache, prefix='jinja2Bytecode:'))
+JINJA_ENVIRONMENT.template_class = InstrumentedTemplate
 
+MAXIMUM_REMINDER_CATCH_UP_MINUTES = 60
+REMINDER_DISPATCHER_ID = 'reminderDispatcherByDueMinute'
+MIGRATION_BATCH_SIZE = 100
+CACHE_EXPIRY_SECONDS = 3600
+DASHBOARD_REBUILD_SECONDS = 3600
+DEFAULT_PAGE_SIZE = 20
+MAXIMUM_PAGE_SIZE = 100
+POPULAR_TAGS_LIMIT = 20
+MAIL_BATCH_SIZE = 100
+AVATAR_SIZES = (32, 64, 128)
+DEFAULT_AVATAR_SIZE = 32
+IMAGE_CACHE_MAX_AGE_SECONDS = 31536000
+IMAGE_SIGNATURES = (('\x89PNG', 'image/png'), ('\xff\xd8', 'image/jpeg'), ('GIF8', 'image/gif'), 
+                    ('BM', 'image/bmp'), ('II*\x00', 'image/tiff'), ('MM\x00*', 'image/tiff'))
+RSS_MAXIMUM_ITEMS = 50
+RSS_BATCH_SIZE = 10
+BULK_RESERVATION_LIMIT = 100
+SEARCH_MAXIMUM_RESULTS = 1000
+RECURRENCE_INTERVAL_DAYS = {'daily': 1, 'weekly': 7}
+RESERVATION_ARCHIVE_AFTER_DAYS = 30
+FREE_SLOTS_MAXIMUM_DAYS = 31
+USAGE_MAXIMUM_DAYS = 31
+USAGE_TOP_RESOURCES_LIMIT = 10
+USAGE_REBUILD_DATES_PER_TASK = 50
+MINUTES_PER_DAY = 24*60
+PAGING_PARAMETERS = ('allResourcesCursor', 'userResourcesCursor', 'userResourcesOffset', 'userReservationsCursor', 'userReservationsOffset')
+CACHE_STATISTICS = {'hits': 0, 'misses': 0}
+CACHE_STATISTICS_LOCK = threading.Lock()
+ROUTE_STATISTICS_WINDOW = 200
+ROUTE_STATISTICS = {}
+ROUTE_STATISTICS_LOCK = threading.Lock()
+REQUEST_STATISTICS = threading.local()
+
+class AvatarThumbnail(ndb.Model):
+    size = ndb.IntegerProperty()
+    imageHash = ndb.StringProperty()
+    
+class ImageBlob(ndb.Model):
+    data = ndb.BlobProperty()
+    contentType = ndb.StringProperty(indexed=False)
+    
 class Resource(ndb.Model):    
     id = ndb.StringProperty(indexed=True, required=True)
     resourceName = ndb.StringProperty(indexed=True)
@@ -26,7 +110,20 @@ class Resource(ndb.Model):
     lastReservationTime = ndb.DateTimeProperty(auto_now_add=False)
     capacity = ndb.IntegerProperty(indexed=False, default=1)
     avatar = ndb.BlobProperty()
+    avatarThumbnails = ndb.LocalStructuredProperty(AvatarThumbnail, repeated=True)
     description = ndb.StringProperty(indexed=False)    
+    availableStartMinutes = ndb.IntegerProperty(indexed=True)
+    availableEndMinutes = ndb.IntegerProperty(indexed=True)
+    nameTokens = ndb.StringProperty(repeated=True)
+    
+    def _pre_put_hook(self):
+        """ Stores the available start and end times as minutes since midnight alongside their string values,
+        and the normalized tokens of the name for searching """
+        if self.availableStartTime and self.availableEndTime:
+            self.availableStartMinutes = convertTimeToMinutes(self.availableStartTime)
+            self.availableEndMinutes = convertTimeToMinutes(self.availableEndTime)
+        if self.resourceName:
+            self.nameTokens = sorted(set(tokenizeName(self.resourceName)))
     
 class Reservation(ndb.Model):    
     reservationID = ndb.StringProperty(indexed=True, required=True)
@@ -38,37 +135,763 @@ class Reservation(ndb.Model):
     resourceName = ndb.StringProperty(indexed=False)
     duration = ndb.StringProperty(indexed=False)
     ownerEmail = ndb.StringProperty(indexed=False)
+    startDateTime = ndb.DateTimeProperty(indexed=True)
+    endDateTime = ndb.DateTimeProperty(indexed=True)
+    durationMinutes = ndb.IntegerProperty(indexed=False)
+    resourceOwnerID = ndb.StringProperty(indexed=True)
+    
+    def _pre_put_hook(self):
+        """ Stores the start, end and duration of the reservation as DateTimes and minutes alongside their string values """
+        if self.date and self.startTime and self.endTime:
+            midnight = datetime.combine(self.date, datetime.min.time())
+            self.startDateTime = midnight + timedelta(minutes = convertTimeToMinutes(self.startTime))
+            self.endDateTime = midnight + timedelta(minutes = convertTimeToMinutes(self.endTime))
+            self.durationMinutes = convertTimeToMinutes(self.endTime) - convertTimeToMinutes(self.startTime)
+    
+class ArchivedReservation(ndb.Model):
+    reservationID = ndb.StringProperty(indexed=False)
+    resourceID = ndb.StringProperty(indexed=True)
+    date = ndb.DateProperty(indexed=True)
+    ownerID = ndb.StringProperty(indexed=True)
+    startTime = ndb.StringProperty(indexed=False)
+    endTime = ndb.StringProperty(indexed=False)
+    resourceName = ndb.StringProperty(indexed=False)
+    duration = ndb.StringProperty(indexed=False)
+    ownerEmail = ndb.StringProperty(indexed=False)
+    startDateTime = ndb.DateTimeProperty(indexed=False)
+    endDateTime = ndb.DateTimeProperty(indexed=False)
+    durationMinutes = ndb.IntegerProperty(indexed=False)
+    resourceOwnerID = ndb.StringProperty(indexed=False)
+    
+class ReservationReminder(ndb.Model):
+    reservationKey = ndb.KeyProperty(kind='Reservation', indexed=False)
+    dueMinute = ndb.DateTimeProperty(indexed=True)
+    
+class ReminderDispatcherState(ndb.Model):
+    lastDispatchedMinute = ndb.DateTimeProperty(indexed=False)
+    
+class TagCount(ndb.Model):
+    tag = ndb.StringProperty(indexed=False)
+    count = ndb.IntegerProperty(indexed=True, default=0)
     
+class ReservationSummary(ndb.Model):
+    reservationID = ndb.StringProperty()
+    resourceID = ndb.StringProperty()
+    resourceName = ndb.StringProperty()
+    ownerID = ndb.StringProperty()
+    ownerEmail = ndb.StringProperty()
+    date = ndb.DateProperty()
+    startTime = ndb.StringProperty()
+    duration = ndb.StringProperty()
+    startDateTime = ndb.DateTimeProperty()
+    endDateTime = ndb.DateTimeProperty()
+    
+class ResourceSummary(ndb.Model):
+    id = ndb.StringProperty()
+    resourceName = ndb.StringProperty()
+    ownerID = ndb.StringProperty()
+    availableStartTime = ndb.StringProperty()
+    availableEndTime = ndb.StringProperty()
+    tags = ndb.StringProperty(repeated=True)
+    capacity = ndb.IntegerProperty()
+    numberOfTimesReserved = ndb.IntegerProperty()
+    lastReservationTime = ndb.DateTimeProperty()
+    
+class UserDashboard(ndb.Model):
+    reservations = ndb.LocalStructuredProperty(ReservationSummary, repeated=True)
+    resources = ndb.LocalStructuredProperty(ResourceSummary, repeated=True)
+    nextExpiryTime = ndb.DateTimeProperty(indexed=True)
+    builtTime = ndb.DateTimeProperty(indexed=False)
+    
+class MailDelivery(ndb.Model):
+    sentTime = ndb.DateTimeProperty(indexed=False, auto_now_add=True)
+    
+class ResourceDayOccupancy(ndb.Model):
+    startMinutes = ndb.IntegerProperty(repeated=True, indexed=False)
+    endMinutes = ndb.IntegerProperty(repeated=True, indexed=False)
+    
+class ResourceUsageRollup(ndb.Model):
+    resourceID = ndb.StringProperty(indexed=False)
+    resourceName = ndb.StringProperty(indexed=False)
+    period = ndb.StringProperty(indexed=True)
+    periodStart = ndb.DateProperty(indexed=True)
+    bookings = ndb.IntegerProperty(indexed=False, default=0)
+    reservedMinutes = ndb.IntegerProperty(indexed=True, default=0)
+    peakConcurrency = ndb.IntegerProperty(indexed=False, default=0)
+    capacity = ndb.IntegerProperty(indexed=False, default=1)
+    availableMinutes = ndb.IntegerProperty(indexed=False, default=0)
+    hourlyBookings = ndb.IntegerProperty(repeated=True, indexed=False)
+    hourlyReservedMinutes = ndb.IntegerProperty(repeated=True, indexed=False)
+    hourlyPeakConcurrency = ndb.IntegerProperty(repeated=True, indexed=False)
+    
+def recordCacheLookup(isHit):
+    """ Counts a cache hit or miss in the statistics of this instance """
+    with CACHE_STATISTICS_LOCK:
+        CACHE_STATISTICS['hits' if isHit else 'misses'] += 1
+
+def getCurrentRequestStatistics():
+    """ Returns the statistics being collected for the request handled by the current thread, or None outside requests """
+    return getattr(REQUEST_STATISTICS, 'current', None)
+
+def recordTemplateRendering(renderingTime):
+    """ Adds the time spent rendering a template to the statistics of the current request """
+    statistics = getCurrentRequestStatistics()
+    if statistics is not None:
+        statistics['templateMilliseconds'] += renderingTime * 1000
+
+def startTemplateRendering():
+    """ Returns whether the template rendering being started is not nested in another one of the current thread """
+    renderingDepth = getattr(REQUEST_STATISTICS, 'renderingDepth', 0)
+    REQUEST_STATISTICS.renderingDepth = renderingDepth + 1
+    return renderingDepth == 0
+
+def finishTemplateRendering(renderingTime, isOutermost):
+    """ Ends a template rendering and records its time unless it is nested, as the outer rendering includes it """
+    REQUEST_STATISTICS.renderingDepth -= 1
+    if isOutermost:
+        recordTemplateRendering(renderingTime)
+
+def countDatastoreEntities(call, request, response):
+    """ Returns the number of entities read or written by a datastore RPC """
+    if call == 'Get':
+        return len([entityResult for entityResult in response.entity_list() if entityResult.has_entity()])
+    if call in ('RunQuery', 'Next'):
+        return response.result_size()
+    if call == 'Put':
+        return request.entity_size()
+    if call == 'Delete':
+        return request.key_size()
+    return 0
+
+def recordApiCallStart(service, call, request, response):
+    """ Notes the start time of an API call made during a request """
+    statistics = getCurrentRequestStatistics()
+    if statistics is not None:
+        statistics['pendingCalls'][id(request)] = time.time()
+
+def recordApiCallEnd(service, call, request, response, rpc=None, error=None):
+    """ Adds a completed API call to the statistics of the current request. Datastore calls are also counted by 
+    the entities they read or wrote and the bytes they sent and received """
+    statistics = getCurrentRequestStatistics()
+    if statistics is None:
+        return
+    startTime = statistics['pendingCalls'].pop(id(request), None)
+    callTime = (time.time() - startTime) * 1000 if startTime else 0.0
+    if service == 'datastore_v3':
+        statistics['datastoreCalls'] += 1
+        statistics['datastoreMilliseconds'] += callTime
+        statistics['datastoreBytes'] += request.ByteSize() + (response.ByteSize() if error is None else 0)
+        if error is None:
+            statistics['datastoreEntities'] += countDatastoreEntities(call, request, response)
+    elif service == 'mail':
+        statistics['mailCalls'] += 1
+        statistics['mailMilliseconds'] += callTime
+    elif service == 'memcache':
+        statistics['memcacheCalls'] += 1
+
+apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('requestStatistics', recordApiCallStart)
+apiproxy_stub_map.apiproxy.GetPostCallHooks().Append('requestStatistics', recordApiCallEnd)
+
+def calculatePercentile(sortedValues, percentile):
+    """ Returns the nearest-rank percentile of a sorted list of values """
+    rank = max(int(round(percentile / 100.0 * len(sortedValues))), 1)
+    return sortedValues[rank - 1]
+
+def recordRouteStatistics(route, statistics):
+    """ Adds the statistics of a completed request to the rolling window of its route """
+    with ROUTE_STATISTICS_LOCK:
+        if route not in ROUTE_STATISTICS:
+            ROUTE_STATISTICS[route] = collections.deque(maxlen=ROUTE_STATISTICS_WINDOW)
+        ROUTE_STATISTICS[route].append(statistics)
+
+def summarizeRouteStatistics():
+    """ Returns the 50th, 90th and 99th percentiles of every measurement of the recent requests of each route """
+    with ROUTE_STATISTICS_LOCK:
+        requestsByRoute = dict((route, list(window)) for route, window in ROUTE_STATISTICS.iteritems())
+    summaries = {}
+    for route, requests in requestsByRoute.iteritems():
+        summary = {'requests': len(requests)}
+        for measurement in ('milliseconds', 'datastoreCalls', 'datastoreEntities', 'datastoreBytes', 'datastoreMilliseconds', 
+                            'templateMilliseconds', 'mailCalls', 'mailMilliseconds', 'memcacheCalls'):
+            values = sorted(request[measurement] for request in requests)
+            summary[measurement] = dict(('p' + str(percentile), round(calculatePercentile(values, percentile), 2)) 
+                                        for percentile in (50, 90, 99))
+        summaries[route] = summary
+    return summaries
+
+class InstrumentationMiddleware(object):
+    
+    def __init__(self, application):
+        self.application = application
+    
+    def __call__(self, environ, start_response):
+        """ Handles a request with the wrapped application while collecting the time it takes, its datastore RPCs, 
+        template rendering and mail calls, then logs them as JSON and adds them to the rolling statistics of its route """
+        statistics = {'datastoreCalls': 0, 'datastoreEntities': 0, 'datastoreBytes': 0, 'datastoreMilliseconds': 0.0, 
+                      'templateMilliseconds': 0.0, 'mailCalls': 0, 'mailMilliseconds': 0.0, 'memcacheCalls': 0, 
+                      'pendingCalls': {}}
+        responseStatus = []
+        def recordingStartResponse(status, headers, exc_info=None):
+            responseStatus.append(status)
+            return start_response(status, headers, exc_info)
+        
+        REQUEST_STATISTICS.current = statistics
+        startTime = time.time()
+        try:
+            return self.application(environ, recordingStartResponse)
+        finally:
+            REQUEST_STATISTICS.current = None
+            del statistics['pendingCalls']
+            statistics['milliseconds'] = (time.time() - startTime) * 1000
+            status = responseStatus[-1] if responseStatus else '500 Internal Server Error'
+            route = environ.get('PATH_INFO', '') if not status.startswith('404') else 'notFound'
+            recordRouteStatistics(route, statistics)
+            logging.info('requestStatistics ' + json.dumps(dict(statistics, route=route, method=environ.get('REQUEST_METHOD'), 
+                                                                status=int(status.split()[0])), sort_keys=True))
+
+@ndb.tasklet
+def readThroughCacheAsync(cacheKey, loadValueAsync):
+    """ Returns a future for the value cached under cacheKey. On a miss the value is loaded by waiting on
+    the future returned by loadValueAsync, and then cached """
+    context = ndb.get_context()
+    value = yield context.memcache_get(cacheKey)
+    if value is not None:
+        recordCacheLookup(True)
+        raise ndb.Return(value)
+    recordCacheLookup(False)
+    value = yield loadValueAsync()
+    try:
+        yield context.memcache_set(cacheKey, value, time=CACHE_EXPIRY_SECONDS)
+    except ValueError:
+        logging.warning("Value too large to cache for key " + cacheKey)
+    raise ndb.Return(value)
+
+def readThroughCache(cacheKey, loadValueAsync):
+    """ Returns the value cached under cacheKey, loading it with loadValueAsync and caching it on a miss """
+    return readThroughCacheAsync(cacheKey, loadValueAsync).get_result()
+
+@ndb.tasklet
+def getVersionedCacheKeyAsync(namespace):
+    """ Returns a future for the cache key of the current version of a group of cached entries """
+    context = ndb.get_context()
+    version = yield context.memcache_get('version:' + namespace)
+    if version is None:
+        version = int(time.time() * 1000)
+        added = yield context.memcache_add('version:' + namespace, version)
+        if not added:
+            version = (yield context.memcache_get('version:' + namespace)) or version
+    raise ndb.Return(namespace + ':' + str(version))
+
+def getVersionedCacheKey(namespace):
+    """ Returns the cache key of the current version of a group of cached entries """
+    return getVersionedCacheKeyAsync(namespace).get_result()
+
+def bumpCacheVersion(namespace):
+    """ Invalidates all cached entries of a group by moving it to a new version """
+    memcache.incr('version:' + namespace, initial_value=int(time.time() * 1000))
+
+def invalidateResourceCaches(resource, previousTags=()):
+    """ Invalidates the cached summary and listing row of a resource and the cached listings that contain it, 
+    including the listings of the tags it had before an edit """
+    memcache.delete_multi(['resourceSummary:' + str(resource.key.id()), 'resourceRow:' + str(resource.id)])
+    bumpCacheVersion('allResources')
+    bumpCacheVersion('userResources:' + str(resource.ownerID))
+    for tag in set(resource.tags) | set(previousTags):
+        bumpCacheVersion('tagResources:' + tag)
+
+def renderResourceRows(resources):
+    """ Returns the rendered listing rows of the resources. Each row is cached separately, so that a listing 
+    only renders the rows of resources that changed since they were last rendered """
+    cacheKeys = ['resourceRow:' + str(resource.id) for resource in resources]
+    cachedRows = memcache.get_multi(cacheKeys)
+    rows = []
+    renderedRows = {}
+    template = JINJA_ENVIRONMENT.get_template('resourceRow.html')
+    for cacheKey, resource in zip(cacheKeys, resources):
+        row = cachedRows.get(cacheKey)
+        recordCacheLookup(row is not None)
+        if row is None:
+            row = template.render(resource=resource)
+            renderedRows[cacheKey] = row
+        rows.append(row)
+    if renderedRows:
+        memcache.set_multi(renderedRows, time=CACHE_EXPIRY_SECONDS)
+    return jinja2.Markup(u''.join(rows))
+
+JINJA_ENVIRONMENT.globals['renderResourceRows'] = renderResourceRows
+
+def invalidateResourceFeed(resourceID):
+    """ Invalidates the cached RSS feed of a resource and records when the feed changed, since deleting 
+    a reservation changes the feed without changing the last reservation time of the resource """
+    memcache.delete('resourceFeed:' + resourceID)
+    memcache.set('resourceFeedModified:' + resourceID, datetime.now())
+
+def getResourceFeedModifiedTime(resource):
+    """ Returns when the RSS feed of a resource last changed, the later of the last reservation time of the resource 
+    and the last change recorded by invalidateResourceFeed. When memcache no longer holds a recorded change, the 
+    current time is recorded instead, so that the feed is never reported older than a change that was forgotten """
+    feedModifiedTime = memcache.get('resourceFeedModified:' + resource.id)
+    if feedModifiedTime is None:
+        feedModifiedTime = datetime.now()
+        memcache.add('resourceFeedModified:' + resource.id, feedModifiedTime)
+    return max(feedModifiedTime, resource.lastReservationTime or feedModifiedTime)
+
+def invalidateFreeSlots(resourceID, reservationDates):
+    """ Invalidates the cached free windows of a resource for the requested dates """
+    memcache.delete_multi(['freeSlots:' + resourceID + ':' + str(reservationDate) for reservationDate in set(reservationDates)])
+
+def invalidateReservationCaches(ownerID):
+    """ Invalidates the cached listing of the reservations made by a user """
+    bumpCacheVersion('userReservations:' + str(ownerID))
+
+@ndb.tasklet
+def getResourceByResourceIDAsync(resourceID):
+    """ Returns a future for the resource having the requested ID. Resources are stored with their ID as the key name, 
+    so this is a key lookup served from NDB's caches; resources stored before that are found by query """
+    resource = yield ndb.Key(Resource, resourceID).get_async()
+    if resource is None:
+        resource = yield Resource.query(Resource.id == resourceID).get_async()
+    raise ndb.Return(resource)
+
 def getResourceByResourceID(resourceID):
     """ Returns the resource having the requested ID """
-    return Resource.query(Resource.id == resourceID).fetch()[0]
+    return getResourceByResourceIDAsync(resourceID).get_result()
+
+def getResourceOwnerIDs(reservations):
+    """ Returns a dictionary of the reservationID of each reservation to the ID of the owner of its resource. The owner 
+    stored on the reservation is used when present, and otherwise the resources are looked up in parallel like 
+    getResourceByResourceID, so that resources not stored under their ID are found as well """
+    resourceFutures = dict((reservation.resourceID, getResourceByResourceIDAsync(reservation.resourceID)) 
+                           for reservation in reservations if reservation.resourceOwnerID is None)
+    resourceOwnerIDs = {}
+    for reservation in reservations:
+        if reservation.resourceOwnerID is not None:
+            resourceOwnerIDs[reservation.reservationID] = reservation.resourceOwnerID
+        else:
+            resource = resourceFutures[reservation.resourceID].get_result()
+            resourceOwnerIDs[reservation.reservationID] = resource.ownerID if resource else None
+    return resourceOwnerIDs
+
+def getReservationKey(resourceID, reservationID):
+    """ Returns the key of a reservation. Reservations are stored with their ID as the key name, 
+    in the entity group of the resource they reserve """
+    return ndb.Key(Resource, resourceID, Reservation, reservationID)
+
+def getReservationByReservationID(resourceID, reservationID):
+    """ Returns the reservation having the requested ID, looked up by key like resources """
+    reservation = None
+    if resourceID:
+        reservation = getReservationKey(resourceID, reservationID).get()
+    if reservation is None:
+        reservation = Reservation.query(Reservation.reservationID == reservationID).get()
+    return reservation
+
+def getCanonicalKey(entity):
+    """ Returns the key a resource or reservation should be stored under """
+    if isinstance(entity, Resource):
+        return ndb.Key(Resource, entity.id)
+    return getReservationKey(entity.resourceID, entity.reservationID)
+
+def getRequestCursor(request, parameterName):
+    """ Returns the datastore cursor passed in the requested parameter, or None for the first page """
+    try:
+        return ndb.Cursor(urlsafe=request.get(parameterName) or None)
+    except Exception:
+        return None
+
+def getRequestOffset(request, parameterName):
+    """ Returns the number of results to skip passed in the requested parameter, or 0 for the first page """
+    offset = request.get(parameterName)
+    return int(offset) if offset.isdigit() else 0
+
+def getRequestPageSize(request):
+    """ Returns the page size passed in the request, limited to MAXIMUM_PAGE_SIZE """
+    try:
+        pageSize = int(request.get('pageSize'))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(pageSize, MAXIMUM_PAGE_SIZE))
+
+@ndb.tasklet
+def fetchCachedPageAsync(namespace, query, cursor, pageSize, offset=0, keysOnly=False):
+    """ Returns a future for one page of the query results and the urlsafe cursor of the next page, or None 
+    on the last page, reading through the versioned cache of the namespace """
+    versionedCacheKey = yield getVersionedCacheKeyAsync(namespace)
+    cacheKey = (versionedCacheKey + ':' + (cursor.urlsafe() if cursor else '') + ':' + str(pageSize) + ':' + str(offset) + 
+                (':keys' if keysOnly else ''))
+    
+    @ndb.tasklet
+    def loadPageAsync():
+        results, nextCursor, more = yield query.fetch_page_async(pageSize, start_cursor=cursor, offset=offset, keys_only=keysOnly)
+        raise ndb.Return((results, nextCursor.urlsafe() if more and nextCursor else None))
+    
+    page = yield readThroughCacheAsync(cacheKey, loadPageAsync)
+    raise ndb.Return(page)
+
+@ndb.tasklet
+def getResourceSummariesAsync(resourceKeys):
+    """ Returns a future for the summaries of the resources with the requested keys, in the same order. 
+    Summaries are read through memcache, and only the resources missing from it are fetched """
+    context = ndb.get_context()
+    cacheKeys = ['resourceSummary:' + str(resourceKey.id()) for resourceKey in resourceKeys]
+    resourceSummaries = yield [context.memcache_get(cacheKey) for cacheKey in cacheKeys]
+    for resourceSummary in resourceSummaries:
+        recordCacheLookup(resourceSummary is not None)
+    missingIndexes = [index for index, resourceSummary in enumerate(resourceSummaries) if resourceSummary is None]
+    if missingIndexes:
+        missingResources = yield ndb.get_multi_async([resourceKeys[index] for index in missingIndexes])
+        cacheFutures = []
+        for index, resource in zip(missingIndexes, missingResources):
+            if resource is not None:
+                resourceSummaries[index] = summarizeResource(resource)
+                cacheFutures.append(context.memcache_set(cacheKeys[index], resourceSummaries[index], time=CACHE_EXPIRY_SECONDS))
+        yield cacheFutures
+    raise ndb.Return([resourceSummary for resourceSummary in resourceSummaries if resourceSummary is not None])
+
+@ndb.tasklet
+def fetchResourceSummaryPageAsync(namespace, query, cursor, pageSize, offset=0):
+    """ Returns a future for the summaries of one page of the resources matching a query and the cursor of the 
+    next page. The page is fetched as a keys-only query, so listings never load the full resource entities """
+    resourceKeys, nextCursor = yield fetchCachedPageAsync(namespace, query, cursor, pageSize, offset, keysOnly=True)
+    resourceSummaries = yield getResourceSummariesAsync(resourceKeys)
+    raise ndb.Return((resourceSummaries, nextCursor))
+
+def getAllResourcesAsync(cursor=None, pageSize=DEFAULT_PAGE_SIZE, offset=0):
+    """ Returns a future for a page of all resources ordered by the last reservation time in reverse, and the cursor of the next page """
+    return fetchResourceSummaryPageAsync('allResources', Resource.query().order(-Resource.lastReservationTime), cursor, pageSize, offset)
 
-def getAllResources():
-    """ Returns all resources ordered by the last reservation time in reverse """
-    return Resource.query().order(-Resource.lastReservationTime).fetch()
+def getAllResources(cursor=None, pageSize=DEFAULT_PAGE_SIZE):
+    """ Returns a page of all resources ordered by the last reservation time in reverse, and the cursor of the next page """
+    return getAllResourcesAsync(cursor, pageSize).get_result()
 
-def getUserResourcesByUserID(userID):
-    """ Returns all resources owned by the requested userID"""
-    return Resource.query(Resource.ownerID == str(userID)).order(-Resource.lastReservationTime).fetch()
+def getUserResourcesByUserIDAsync(userID, cursor=None, pageSize=DEFAULT_PAGE_SIZE, offset=0):
+    """ Returns a future for a page of the resources owned by the requested userID, and the cursor of the next page """
+    return fetchResourceSummaryPageAsync('userResources:' + str(userID), 
+                                         Resource.query(Resource.ownerID == str(userID)).order(-Resource.lastReservationTime), 
+                                         cursor, pageSize, offset)
 
-def getReservationsByResourceID(resourceID):
-    """ Returns all reservations made for the resource with the requested resourceID, sorted by reservation date and time"""
-    resourceReservations = Reservation.query(Reservation.resourceID == resourceID).order(Reservation.date, Reservation.startTime).fetch()
-    return collectUpcomingReservationsOnly(resourceReservations)
+def getUserResourcesByUserID(userID, cursor=None, pageSize=DEFAULT_PAGE_SIZE):
+    """ Returns a page of the resources owned by the requested userID, and the cursor of the next page """
+    return getUserResourcesByUserIDAsync(userID, cursor, pageSize).get_result()
 
-def getReservationsByUserID(userID):
-    """ Returns all reservations made by the user with the requested userID, sorted by reservation date and time """
-    userReservations = Reservation.query(Reservation.ownerID == str(userID)).order(Reservation.date, Reservation.startTime).fetch()
-    return collectUpcomingReservationsOnly(userReservations)
+def getResourcesByTag(tag, cursor=None, pageSize=DEFAULT_PAGE_SIZE):
+    """ Returns a page of the resources tagged with the requested tag, ordered by the last reservation time in reverse, 
+    and the cursor of the next page """
+    return fetchResourceSummaryPageAsync('tagResources:' + tag, 
+                                         Resource.query(Resource.tags == tag).order(-Resource.lastReservationTime), cursor, pageSize).get_result()
+
+@ndb.transactional
+def adjustTagCount(tag, change):
+    """ Adds change to the number of resources tagged with the requested tag """
+    tagCount = ndb.Key(TagCount, tag).get() or TagCount(id=tag, tag=tag)
+    tagCount.count += change
+    tagCount.put()
+
+def updateTagCounts(addedTags, removedTags):
+    """ Updates the number of resources per tag after tags were added to or removed from a resource """
+    for tag in set(addedTags) - set(removedTags):
+        if tag:
+            adjustTagCount(tag, 1)
+    for tag in set(removedTags) - set(addedTags):
+        if tag:
+            adjustTagCount(tag, -1)
+    bumpCacheVersion('popularTags')
+
+def getPopularTags():
+    """ Returns the most used tags and the number of resources tagged with each """
+    return readThroughCache(getVersionedCacheKey('popularTags'), 
+                            lambda: TagCount.query(TagCount.count > 0).order(-TagCount.count).fetch_async(POPULAR_TAGS_LIMIT))
+
+def tokenizeName(name):
+    """ Splits a name into lowercase words """
+    return re.findall(r'\w+', name.lower(), re.UNICODE)
+
+def rankSearchResult(resource, normalizedQuery):
+    """ Returns the rank of a resource for a name search, lower being better: an exact name match comes 
+    first, then names starting with the query, then names whose words start with all query words """
+    normalizedName = ' '.join(tokenizeName(resource.resourceName))
+    if normalizedName == normalizedQuery:
+        return 0
+    if normalizedName.startswith(normalizedQuery):
+        return 1
+    return 2
+
+@ndb.tasklet
+def getRankedSearchResultsAsync(queryTokens):
+    """ Returns a future for the summaries of the resources whose name has words starting with every query word, 
+    ranked by rankSearchResult and then by name """
+    versionedCacheKey = yield getVersionedCacheKeyAsync('allResources')
+    normalizedQuery = ' '.join(queryTokens)
+    indexedToken = max(queryTokens, key=len)
+    
+    @ndb.tasklet
+    def rankResourcesAsync():
+        resourceKeys = yield Resource.query(Resource.nameTokens >= indexedToken, 
+                                            Resource.nameTokens < indexedToken + u'\ufffd').order(
+                                            Resource.nameTokens).fetch_async(SEARCH_MAXIMUM_RESULTS, keys_only=True)
+        uniqueResourceKeys = []
+        seenResourceKeys = set()
+        for resourceKey in resourceKeys:
+            if resourceKey not in seenResourceKeys:
+                seenResourceKeys.add(resourceKey)
+                uniqueResourceKeys.append(resourceKey)
+        resources = yield getResourceSummariesAsync(uniqueResourceKeys)
+        matchingResources = []
+        for resource in resources:
+            nameTokens = tokenizeName(resource.resourceName)
+            if all(any(nameToken.startswith(queryToken) for nameToken in nameTokens) for queryToken in queryTokens):
+                matchingResources.append(resource)
+        matchingResources.sort(key=lambda resource: (rankSearchResult(resource, normalizedQuery), 
+                                                     resource.resourceName.lower()))
+        raise ndb.Return(matchingResources)
+    
+    rankedResources = yield readThroughCacheAsync(versionedCacheKey + ':search:' + normalizedQuery, rankResourcesAsync)
+    raise ndb.Return(rankedResources)
+
+def searchResourcesByName(query, offset=0, pageSize=DEFAULT_PAGE_SIZE):
+    """ Returns a page of the resources whose name has words starting with every word of the query, ignoring case,
+    starting at offset in the ranking of all matching resources, and the offset of the next page """
+    queryTokens = tokenizeName(query)
+    if not queryTokens:
+        return [], None
+    rankedResources = getRankedSearchResultsAsync(queryTokens).get_result()
+    nextOffset = offset + pageSize
+    return rankedResources[offset:nextOffset], (nextOffset if nextOffset < len(rankedResources) else None)
+
+def getReservationDateWindow(startDate=None, endDate=None):
+    """ Returns the first and last dates of the reservations to query. The first date is never before the current 
+    date, since reservations of past dates are no longer upcoming, and the last date is None when there is no limit """
+    today = getCurrentDateTime().date()
+    return max(startDate or today, today), endDate
+
+def filterReservationDates(query, startDate, endDate):
+    """ Restricts a reservation query to the dates from startDate up to and including endDate, if given, 
+    so that the datastore only returns reservations within the window """
+    query = query.filter(Reservation.date >= startDate)
+    if endDate:
+        query = query.filter(Reservation.date <= endDate)
+    return query
+
+@ndb.tasklet
+def getReservationsByResourceIDAsync(resourceID, startDate=None, endDate=None):
+    """ Returns a future for all upcoming reservations made for the resource with the requested resourceID, optionally 
+    only those dated from startDate up to and including endDate, sorted by reservation date and time"""
+    startDate, endDate = getReservationDateWindow(startDate, endDate)
+    query = filterReservationDates(Reservation.query(ancestor=ndb.Key(Resource, resourceID)), startDate, endDate)
+    resourceReservations = yield query.order(Reservation.date, Reservation.startDateTime).fetch_async()
+    raise ndb.Return(collectUpcomingReservationsOnly(resourceReservations))
+
+def getReservationsByResourceID(resourceID, startDate=None, endDate=None):
+    """ Returns all upcoming reservations made for the resource with the requested resourceID, optionally 
+    only those dated from startDate up to and including endDate, sorted by reservation date and time"""
+    return getReservationsByResourceIDAsync(resourceID, startDate, endDate).get_result()
+
+@ndb.tasklet
+def getReservationsByUserIDAsync(userID, startDate=None, endDate=None):
+    """ Returns a future for all upcoming reservations made by the user with the requested userID, optionally 
+    only those dated from startDate up to and including endDate, sorted by reservation date and time """
+    startDate, endDate = getReservationDateWindow(startDate, endDate)
+    versionedCacheKey = yield getVersionedCacheKeyAsync('userReservations:' + str(userID))
+    query = filterReservationDates(Reservation.query(Reservation.ownerID == str(userID)), startDate, endDate)
+    userReservations = yield readThroughCacheAsync(versionedCacheKey + ':' + str(startDate) + ':' + str(endDate or ''), 
+                                                   lambda: query.order(Reservation.date, Reservation.startDateTime).fetch_async())
+    raise ndb.Return(collectUpcomingReservationsOnly(userReservations))
+
+def getReservationsByUserID(userID, startDate=None, endDate=None):
+    """ Returns all upcoming reservations made by the user with the requested userID, optionally 
+    only those dated from startDate up to and including endDate, sorted by reservation date and time """
+    return getReservationsByUserIDAsync(userID, startDate, endDate).get_result()
+    
+@ndb.tasklet
+def getReservationsPageByUserIDAsync(userID, cursor=None, pageSize=DEFAULT_PAGE_SIZE, offset=0):
+    """ Returns a future for the upcoming reservations within a page of the reservations made by the user with the 
+    requested userID, sorted by reservation date and time, and the cursor of the next page """
+    startDate, endDate = getReservationDateWindow()
+    query = filterReservationDates(Reservation.query(Reservation.ownerID == str(userID)), startDate, endDate)
+    userReservations, nextCursor = yield fetchCachedPageAsync('userReservations:' + str(userID), 
+                                                              query.order(Reservation.date, Reservation.startDateTime), 
+                                                              cursor, pageSize, offset)
+    raise ndb.Return((collectUpcomingReservationsOnly(userReservations), nextCursor))
+
+def getReservationsPageByUserID(userID, cursor=None, pageSize=DEFAULT_PAGE_SIZE):
+    """ Returns the upcoming reservations within a page of the reservations made by the user with the requested userID, 
+    sorted by reservation date and time, and the cursor of the next page """
+    return getReservationsPageByUserIDAsync(userID, cursor, pageSize).get_result()
+
+def summarizeReservation(reservation):
+    """ Returns the fields of a reservation shown in listings """
+    return ReservationSummary(reservationID=reservation.reservationID, resourceID=reservation.resourceID, 
+                              resourceName=reservation.resourceName, ownerID=reservation.ownerID, 
+                              ownerEmail=reservation.ownerEmail, date=reservation.date, startTime=reservation.startTime, 
+                              duration=reservation.duration, startDateTime=reservation.startDateTime, 
+                              endDateTime=reservation.endDateTime)
+
+def summarizeResource(resource):
+    """ Returns the fields of a resource shown in listings """
+    return ResourceSummary(id=resource.id, resourceName=resource.resourceName, ownerID=resource.ownerID, 
+                           availableStartTime=resource.availableStartTime, availableEndTime=resource.availableEndTime, 
+                           tags=resource.tags, capacity=resource.capacity, 
+                           numberOfTimesReserved=resource.numberOfTimesReserved, 
+                           lastReservationTime=resource.lastReservationTime)
+
+def sortResourceSummaries(resourceSummaries):
+    """ Sorts resource summaries by the last reservation time in reverse, never reserved resources last """
+    resourceSummaries.sort(key=lambda resourceSummary: resourceSummary.lastReservationTime or datetime.min, reverse=True)
+
+def removeExpiredReservations(dashboard):
+    """ Drops the reservations that have ended from a dashboard and records when the next one ends """
+    currentDateTime = getCurrentDateTime()
+    dashboard.reservations = [reservationSummary for reservationSummary in dashboard.reservations 
+                              if reservationSummary.endDateTime >= currentDateTime]
+    dashboard.nextExpiryTime = min([reservationSummary.endDateTime for reservationSummary in dashboard.reservations] or [None])
+
+def buildUserDashboard(userID, staleDashboard=None):
+    """ Builds the dashboard of a user from the user's resources and upcoming reservations, and stores it in place 
+    of staleDashboard unless another request has stored a dashboard meanwhile """
+    resourcesFuture = Resource.query(Resource.ownerID == str(userID)).fetch_async()
+    reservationsFuture = getReservationsByUserIDAsync(userID)
+    dashboard = UserDashboard(id=str(userID), builtTime=datetime.now())
+    dashboard.resources = [summarizeResource(resource) for resource in resourcesFuture.get_result()]
+    sortResourceSummaries(dashboard.resources)
+    dashboard.reservations = [summarizeReservation(reservation) for reservation in reservationsFuture.get_result()]
+    removeExpiredReservations(dashboard)
+    return storeBuiltDashboard(dashboard, staleDashboard.builtTime if staleDashboard else None)
+
+@ndb.transactional
+def storeBuiltDashboard(dashboard, staleBuiltTime):
+    """ Stores a built dashboard if the stored one, if any, was built at staleBuiltTime, and returns the stored dashboard """
+    storedDashboard = dashboard.key.get()
+    if storedDashboard and storedDashboard.builtTime != staleBuiltTime:
+        return storedDashboard
+    dashboard.put()
+    return dashboard
+
+def isDashboardStale(dashboard):
+    """ Checks if a dashboard was built more than DASHBOARD_REBUILD_SECONDS ago """
+    return dashboard.builtTime is None or dashboard.builtTime < datetime.now() - timedelta(seconds = DASHBOARD_REBUILD_SECONDS)
+
+def enqueueDashboardUpdate(userID, reservationKeys=(), resourceKey=None, transactional=False):
+    """ Queues the update of the dashboard of a user with the current summaries of reservations and of a resource """
+    params = {'userID': str(userID), 'reservationKey': [reservationKey.urlsafe() for reservationKey in reservationKeys]}
+    if resourceKey:
+        params['resourceKey'] = resourceKey.urlsafe()
+    taskqueue.add(url='/tasks/updateDashboard', transactional=transactional, params=params)
+
+@ndb.transactional
+def updateUserDashboard(userID, updateDashboard):
+    """ Applies updateDashboard to the stored dashboard of a user. Users without a dashboard are skipped, 
+    since their dashboard is built from the datastore the next time it is viewed """
+    dashboard = ndb.Key(UserDashboard, str(userID)).get()
+    if dashboard is None:
+        return
+    updateDashboard(dashboard)
+    removeExpiredReservations(dashboard)
+    dashboard.put()
+
+def addReservationsToDashboard(userID, reservations):
+    """ Adds reservations made by a user to the dashboard of that user in a single transaction, replacing their 
+    summaries if they are already listed """
+    reservationIDs = set(reservation.reservationID for reservation in reservations)
+    def addReservations(dashboard):
+        dashboard.reservations = [reservationSummary for reservationSummary in dashboard.reservations 
+                                  if reservationSummary.reservationID not in reservationIDs]
+        dashboard.reservations.extend(summarizeReservation(reservation) for reservation in reservations)
+        dashboard.reservations.sort(key=lambda reservationSummary: reservationSummary.startDateTime)
+    updateUserDashboard(userID, addReservations)
+
+def removeReservationFromDashboard(reservation):
+    """ Removes a deleted reservation from the dashboard of the user who made it """
+    removeReservationsFromDashboard(reservation.ownerID, [reservation])
+
+def removeReservationsFromDashboard(userID, reservations):
+    """ Removes deleted reservations made by a user from the dashboard of that user in a single transaction """
+    reservationIDs = set(reservation.reservationID for reservation in reservations)
+    def removeReservations(dashboard):
+        dashboard.reservations = [reservationSummary for reservationSummary in dashboard.reservations 
+                                  if reservationSummary.reservationID not in reservationIDs]
+    updateUserDashboard(userID, removeReservations)
+
+def replaceResourceSummary(resourceSummaries, resource):
+    """ Returns the resource summaries with the summary of the resource replaced by its current values """
+    return [resourceSummary for resourceSummary in resourceSummaries if resourceSummary.id != resource.id] + [summarizeResource(resource)]
+
+def updateResourceInDashboards(resource):
+    """ Updates the summary of a created, edited or reserved resource in the dashboard of its owner """
+    def updateResource(dashboard):
+        dashboard.resources = replaceResourceSummary(dashboard.resources, resource)
+        sortResourceSummaries(dashboard.resources)
+    updateUserDashboard(resource.ownerID, updateResource)
+
+@ndb.transactional
+def putResource(resource):
+    """ Stores a created or edited resource and queues the update of its summary in the dashboard of its owner """
+    resource.put()
+    enqueueDashboardUpdate(resource.ownerID, resourceKey=resource.key, transactional=True)
+
+def getDashboardTemplateValues(userID, includeAllResources):
+    """ Returns the template values of the first pages of the listings shown on the home page and user pages. The 
+    listings of the user are rendered from the dashboard of the user, which links to the rest of a listing longer 
+    than a page by its offset, and the first page of all resources is read through the cache in parallel """
+    dashboardFuture = ndb.Key(UserDashboard, str(userID)).get_async()
+    allResourcesFuture = getAllResourcesAsync() if includeAllResources else None
+    dashboard = dashboardFuture.get_result()
+    if dashboard is None or isDashboardStale(dashboard):
+        dashboard = buildUserDashboard(userID, dashboard)
+    
+    currentDateTime = getCurrentDateTime()
+    userReservations = [reservationSummary for reservationSummary in dashboard.reservations 
+                        if reservationSummary.endDateTime >= currentDateTime]
+    listingValues = {
+        'pageSize': DEFAULT_PAGE_SIZE,
+        'userResources': dashboard.resources[:DEFAULT_PAGE_SIZE],
+        'userReservations': userReservations[:DEFAULT_PAGE_SIZE]
+    }
+    if len(dashboard.resources) > DEFAULT_PAGE_SIZE:
+        listingValues['userResourcesOffset'] = DEFAULT_PAGE_SIZE
+    if len(userReservations) > DEFAULT_PAGE_SIZE:
+        listingValues['userReservationsOffset'] = DEFAULT_PAGE_SIZE
+    if includeAllResources:
+        listingValues['allResources'], listingValues['allResourcesCursor'] = allResourcesFuture.get_result()
+    return listingValues
+
+def getListingTemplateValues(request, userID, includeAllResources):
+    """ Returns the template values of the listings shown on the home page and user pages. The first view is 
+    rendered from the user's dashboard. Further pages of a listing are paged independently through its own cursor 
+    parameter, and all of them are fetched in parallel """
+    if not any(request.get(parameterName) for parameterName in PAGING_PARAMETERS):
+        return getDashboardTemplateValues(userID, includeAllResources)
+    
+    pageSize = getRequestPageSize(request)
+    listingFutures = {
+        'userResources': getUserResourcesByUserIDAsync(userID, getRequestCursor(request, 'userResourcesCursor'), pageSize, 
+                                                       getRequestOffset(request, 'userResourcesOffset')),
+        'userReservations': getReservationsPageByUserIDAsync(userID, getRequestCursor(request, 'userReservationsCursor'), pageSize, 
+                                                             getRequestOffset(request, 'userReservationsOffset'))
+    }
+    if includeAllResources:
+        listingFutures['allResources'] = getAllResourcesAsync(getRequestCursor(request, 'allResourcesCursor'), pageSize)
     
+    listingValues = {'pageSize': pageSize}
+    for listingName, listingFuture in listingFutures.iteritems():
+        listingValues[listingName], listingValues[listingName + 'Cursor'] = listingFuture.get_result()
+    return listingValues
+
 def collectUpcomingReservationsOnly(reservations):    
     """ Returns reservations whose end time has not yet passed """
     upcomingReservations=[]
+    currentDateTime = getCurrentDateTime()
     for reservation in reservations:
-        if not hasReservationTimePassed(str(reservation.date), reservation.endTime):
+        if reservation.endDateTime:
+            if reservation.endDateTime >= currentDateTime:
+                upcomingReservations.append(reservation)
+        elif not hasReservationTimePassed(str(reservation.date), reservation.endTime):
             upcomingReservations.append(reservation)
     return upcomingReservations
 
+def getCurrentDateTime():
+    """ Returns the current date and time in the time zone of the application """
+    return datetime.now() - timedelta(hours = 4)
+
 def formatOnlyDate(requestedDate):
     """ Converts string value of date to DateTime """
     return datetime.strptime(requestedDate , '%Y-%m-%d')
@@ -92,6 +915,103 @@ def sendReservationStartedEmail(reservation):
                    + str(reservation.date) + """ from """ + reservation.startTime + """ hours for duration: """ + 
                    reservation.duration + """ has now started!""")
     
+MAIL_SENDERS = {
+    'booked': sendReservationBookedEmail,
+    'started': sendReservationStartedEmail
+}
+
+def enqueueReservationEmails(notification, reservationKeys, taskName=None, transactional=False):
+    """ Queues the delivery of a notification email for each of the reservations on the mail queue, 
+    in batches of MAIL_BATCH_SIZE reservations per task. A named batch is queued at most once """
+    for batchStart in range(0, len(reservationKeys), MAIL_BATCH_SIZE):
+        batchKeys = reservationKeys[batchStart:batchStart + MAIL_BATCH_SIZE]
+        try:
+            taskqueue.add(queue_name='mail', url='/tasks/deliverMail', transactional=transactional,
+                          name=taskName + '-' + str(batchStart) if taskName else None,
+                          params={'notification': notification, 'reservationKey': [key.urlsafe() for key in batchKeys]})
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            logging.info("Mail batch " + taskName + "-" + str(batchStart) + " has already been queued")
+
+def deliverReservationEmail(notification, reservation):
+    """ Sends a notification email for a reservation unless it has already been sent, and records that it was sent. 
+    The record is keyed by the notification and reservation, so retried or duplicated tasks never mail a reservation twice """
+    deliveryKey = ndb.Key(MailDelivery, notification + ':' + reservation.reservationID)
+    if deliveryKey.get() is not None:
+        return
+    MAIL_SENDERS[notification](reservation)
+    MailDelivery(key=deliveryKey).put()
+
+def detectImageContentType(imageData):
+    """ Returns the content type of an image from the signature at the start of its data """
+    for signature, contentType in IMAGE_SIGNATURES:
+        if imageData.startswith(signature):
+            return contentType
+    return 'application/octet-stream'
+
+def storeImage(imageData):
+    """ Stores an image under the SHA-1 hash of its data, so identical images are stored once, and returns the hash """
+    imageHash = hashlib.sha1(imageData).hexdigest()
+    ImageBlob(id=imageHash, data=imageData, contentType=detectImageContentType(imageData)).put()
+    return imageHash
+
+def storeAvatarThumbnails(avatar):
+    """ Stores a thumbnail of an uploaded avatar for each of the AVATAR_SIZES and returns their descriptions """
+    return [AvatarThumbnail(size=size, imageHash=storeImage(images.resize(avatar, size, size))) for size in AVATAR_SIZES]
+
+def getAvatarHash(resource, size):
+    """ Returns the hash of the stored avatar thumbnail of a resource closest to the requested size, if any """
+    if not resource.avatarThumbnails:
+        return None
+    return min(resource.avatarThumbnails, key=lambda thumbnail: abs(thumbnail.size - size)).imageHash
+
+def requestMatchesETag(request, etag):
+    """ Checks if the If-None-Match header of a request contains the quoted etag """
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+def requestNotModifiedSince(request, lastModified):
+    """ Checks if the If-Modified-Since header of a request is at or after lastModified """
+    ifModifiedSince = parsedate_tz(request.headers.get('If-Modified-Since', ''))
+    return ifModifiedSince is not None and mktime_tz(ifModifiedSince) >= calendar.timegm(lastModified.timetuple())
+
+def getReservationReminderKey(reservation):
+    """ Returns the key of the reminder of a reservation, which belongs to the entity group of the reservation, so that 
+    it is created and deleted in the same transaction as the reservation """
+    return ndb.Key(ReservationReminder, reservation.reservationID, parent=reservation.key.parent())
+
+def buildReservationReminder(reservation):
+    """ Returns the reminder of a reservation, due at the minute the reservation starts, which has not been stored yet """
+    dueMinute = reservation.startDateTime or formatToDateTime(str(reservation.date), reservation.startTime)
+    return ReservationReminder(key=getReservationReminderKey(reservation), reservationKey=reservation.key, dueMinute=dueMinute)
+
+def createReservationReminders(reservations):
+    """ Schedules the reminder emails of those reservations that have not started yet with a single batch write """
+    currentMinute = getCurrentDateTime().replace(second=0, microsecond=0)
+    reminders = [buildReservationReminder(reservation) for reservation in reservations]
+    ndb.put_multi([reminder for reminder in reminders if reminder.dueMinute >= currentMinute])
+
+def backfillReservationReminders():
+    """ Schedules reminders for all upcoming reservations, and deletes the reminders filed under per-minute 
+    ReminderBucket parents before reminders were indexed by the minute they are due """
+    reservations = Reservation.query(Reservation.date >= getCurrentDateTime().date()).fetch()
+    createReservationReminders(reservations)
+    ndb.delete_multi([reminderKey for reminderKey in ReservationReminder.query().iter(keys_only=True) 
+                      if reminderKey.parent() and reminderKey.parent().kind() == 'ReminderBucket'])
+
+def getUndispatchedReminderMinutes(state, currentMinute):
+    """ Returns the first and last minute whose reminders are to be dispatched at currentMinute, catching up on at most 
+    MAXIMUM_REMINDER_CATCH_UP_MINUTES and including the minute last dispatched """
+    lastDispatchedMinute = state.lastDispatchedMinute if state else currentMinute - timedelta(minutes = 1)
+    firstMinute = max(lastDispatchedMinute, currentMinute - timedelta(minutes = MAXIMUM_REMINDER_CATCH_UP_MINUTES - 1))
+    return firstMinute, currentMinute
+
+@ndb.transactional
+def advanceReminderDispatcher(dispatchedMinute):
+    """ Records that the reminders due up to and including dispatchedMinute have been queued """
+    stateKey = ndb.Key(ReminderDispatcherState, REMINDER_DISPATCHER_ID)
+    state = stateKey.get() or ReminderDispatcherState(key=stateKey, lastDispatchedMinute=dispatchedMinute)
+    state.lastDispatchedMinute = max(state.lastDispatchedMinute, dispatchedMinute)
+    state.put()
+
 def calculateRequestedTimeArray(requestedTime):
     """ Splits string value of time to hours and minutes """
     timeArray = requestedTime.split(":")            
@@ -113,7 +1033,7 @@ def hasReservationTimePassed(requestedDate, requestedTime):
     """ Checks if the requested reservation time is before the current time. Since the seconds field
     is not taken into consideration, if the current time is 12:17 PM, a requested time of 12:17 PM will be
     considered as passed for the current date. """  
-    currentDateTime = datetime.now() - timedelta(hours = 4)
+    currentDateTime = getCurrentDateTime()
     requestedDateFormatted = formatOnlyDate(requestedDate)
     if requestedDateFormatted.date() < currentDateTime.date():
         return True
@@ -124,56 +1044,501 @@ def hasReservationTimePassed(requestedDate, requestedTime):
         return False
     return False
     
+def convertTimeToMinutes(stringTime):
+    """ Converts string value of time in H:M format to the number of minutes since midnight """
+    timeArray = stringTime.split(":")
+    return int(timeArray[0])*60 + int(timeArray[1])
+
+def getReservationMinutes(reservation):
+    """ Returns the start and end of a reservation as minutes since midnight of its date """
+    if reservation.startDateTime and reservation.endDateTime:
+        midnight = datetime.combine(reservation.date, datetime.min.time())
+        return (int((reservation.startDateTime - midnight).total_seconds())//60, 
+                int((reservation.endDateTime - midnight).total_seconds())//60)
+    return convertTimeToMinutes(reservation.startTime), convertTimeToMinutes(reservation.endTime)
+
+def getResourceAvailableMinutes(resource):
+    """ Returns the available start and end times of a resource as minutes since midnight """
+    if resource.availableStartMinutes is not None and resource.availableEndMinutes is not None:
+        return resource.availableStartMinutes, resource.availableEndMinutes
+    return convertTimeToMinutes(resource.availableStartTime), convertTimeToMinutes(resource.availableEndTime)
+
+def getResourceDayOccupancyKey(resourceID, reservationDate):
+    """ Returns the key of the occupancy index of a resource for a particular date, which belongs to the 
+    entity group of the resource like its reservations """
+    return ndb.Key(Resource, resourceID, ResourceDayOccupancy, str(reservationDate))
+
+def buildResourceDayOccupancy(resourceID, reservationDate):
+    """ Builds the occupancy index of a resource for a particular date from its stored reservations """
+    occupancy = ResourceDayOccupancy(key=getResourceDayOccupancyKey(resourceID, reservationDate))
+    reservations = Reservation.query(Reservation.date == reservationDate, ancestor=ndb.Key(Resource, resourceID)).fetch()
+    reservationMinutes = [getReservationMinutes(reservation) for reservation in reservations]
+    occupancy.startMinutes = sorted(startMinutes for startMinutes, endMinutes in reservationMinutes)
+    occupancy.endMinutes = sorted(endMinutes for startMinutes, endMinutes in reservationMinutes)
+    return occupancy
+
+def getResourceDayOccupancy(resourceID, reservationDate):
+    """ Returns the occupancy index of a resource for a particular date, building and storing it
+    from the datastore the first time it is requested. It is only called within the booking transaction, 
+    so that a built index never overwrites an interval added by a concurrent booking """
+    occupancy = getResourceDayOccupancyKey(resourceID, reservationDate).get()
+    if occupancy is None:
+        occupancy = buildResourceDayOccupancy(resourceID, reservationDate)
+        occupancy.put()
+    return occupancy
+
+def getResourceDayOccupancies(resourceID, reservationDates):
+    """ Returns a dictionary of each of the sorted reservationDates to the occupancy index of the resource for that date. 
+    The stored indexes are read with one batch get, and those not built yet are built, without being stored, from 
+    a single ancestor query bounded by their dates """
+    occupancyKeys = [getResourceDayOccupancyKey(resourceID, reservationDate) for reservationDate in reservationDates]
+    occupancies = dict(zip(reservationDates, ndb.get_multi(occupancyKeys)))
+    missingDates = [reservationDate for reservationDate in reservationDates if occupancies[reservationDate] is None]
+    if missingDates:
+        for reservationDate in missingDates:
+            occupancies[reservationDate] = ResourceDayOccupancy(key=getResourceDayOccupancyKey(resourceID, reservationDate))
+        storedReservations = Reservation.query(Reservation.date >= missingDates[0], Reservation.date <= missingDates[-1],
+                                               ancestor=ndb.Key(Resource, resourceID)).fetch()
+        for storedReservation in storedReservations:
+            if storedReservation.date in missingDates:
+                startMinutes, endMinutes = getReservationMinutes(storedReservation)
+                addIntervalToOccupancy(occupancies[storedReservation.date], startMinutes, endMinutes)
+    return occupancies
+
+def addIntervalToOccupancy(occupancy, startMinutes, endMinutes):
+    """ Adds a reservation interval to an occupancy index, keeping the start and end lists sorted """
+    bisect.insort(occupancy.startMinutes, startMinutes)
+    bisect.insort(occupancy.endMinutes, endMinutes)
+
+def removeIntervalFromOccupancy(occupancy, startMinutes, endMinutes):
+    """ Removes a reservation interval from an occupancy index """
+    if startMinutes in occupancy.startMinutes:
+        occupancy.startMinutes.remove(startMinutes)
+    if endMinutes in occupancy.endMinutes:
+        occupancy.endMinutes.remove(endMinutes)
+
+@ndb.transactional(xg=True)
+def bookReservation(reservation, resource):
+    """ Stores a new reservation unless its resource has reached capacity for the requested time. Returns the 
+    updated resource, or None if the resource has reached capacity. The capacity check, the reservation, the occupancy index and the reservation counter 
+    of the resource are all in the entity group of the resource, so concurrent bookings of a resource are 
+    serialized by the datastore and can neither overbook it nor lose counter increments """
+    occupancy = getResourceDayOccupancy(reservation.resourceID, reservation.date)
+    startMinutes, endMinutes = getReservationMinutes(reservation)
+    if calculateMaximumOccupancy(occupancy.startMinutes, occupancy.endMinutes, startMinutes, endMinutes) >= resource.capacity:
+        return None
+    addIntervalToOccupancy(occupancy, startMinutes, endMinutes)
+    resource = resource.key.get()
+    resource.lastReservationTime = datetime.now()
+    resource.numberOfTimesReserved += 1
+    ndb.put_multi([reservation, occupancy, resource, buildReservationReminder(reservation)])
+    enqueueReservationEmails('booked', [reservation.key], transactional=True)
+    enqueueDashboardUpdate(reservation.ownerID, reservationKeys=[reservation.key], transactional=True)
+    enqueueDashboardUpdate(resource.ownerID, resourceKey=resource.key, transactional=True)
+    enqueueUsageRollupUpdate(reservation.resourceID, [reservation.date], transactional=True)
+    return resource
+
+@ndb.transactional(xg=True)
+def bookReservations(reservations, resource, allOrNothing):
+    """ Stores the reservations of a resource that fit its capacity, or none of them in allOrNothing mode unless all fit. 
+    Returns the booked reservations, the rejected reservations and the updated resource """
+    occupancies = getResourceDayOccupancies(resource.id, sorted(set(reservation.date for reservation in reservations)))
+    
+    bookedReservations = []
+    rejectedReservations = []
+    for reservation in reservations:
+        occupancy = occupancies[reservation.date]
+        startMinutes, endMinutes = getReservationMinutes(reservation)
+        if calculateMaximumOccupancy(occupancy.startMinutes, occupancy.endMinutes, startMinutes, endMinutes) >= resource.capacity:
+            rejectedReservations.append(reservation)
+        else:
+            addIntervalToOccupancy(occupancy, startMinutes, endMinutes)
+            bookedReservations.append(reservation)
+    if not bookedReservations or (allOrNothing and rejectedReservations):
+        return [], rejectedReservations, resource
+    
+    resource = resource.key.get()
+    resource.lastReservationTime = datetime.now()
+    resource.numberOfTimesReserved += len(bookedReservations)
+    bookedDates = set(reservation.date for reservation in bookedReservations)
+    ndb.put_multi(bookedReservations + [occupancies[reservationDate] for reservationDate in sorted(bookedDates)] + [resource] + 
+                  [buildReservationReminder(reservation) for reservation in bookedReservations])
+    enqueueReservationEmails('booked', [reservation.key for reservation in bookedReservations], transactional=True)
+    enqueueDashboardUpdate(bookedReservations[0].ownerID, reservationKeys=[reservation.key for reservation in bookedReservations], 
+                           transactional=True)
+    enqueueDashboardUpdate(resource.ownerID, resourceKey=resource.key, transactional=True)
+    enqueueUsageRollupUpdate(resource.id, bookedDates, transactional=True)
+    return bookedReservations, rejectedReservations, resource
+
+def archiveReservations(reservations):
+    """ Moves reservations to the ArchivedReservation kind, within the entity groups of their resources, and deletes 
+    the occupancy indexes of their dates. The archived copies are stored before the reservations are deleted, so 
+    a batch interrupted in between is simply archived again """
+    ndb.put_multi([ArchivedReservation(key=ndb.Key(ArchivedReservation, reservation.reservationID, parent=reservation.key.parent()), 
+                                       **reservation.to_dict()) for reservation in reservations])
+    occupancyKeys = set(getResourceDayOccupancyKey(reservation.resourceID, reservation.date) for reservation in reservations)
+    ndb.delete_multi([reservation.key for reservation in reservations] + list(occupancyKeys))
+
+@ndb.transactional
+def removeReservationsOfResource(resourceID, reservations):
+    """ Deletes reservations of one resource along with their reminders and their intervals in the occupancy indexes 
+    of the resource, with one batch get and one batch write in the entity group of the resource, and queues the update of the usage 
+    rollups of their dates """
+    reservationDates = sorted(set(reservation.date for reservation in reservations))
+    occupancies = [occupancy for occupancy in ndb.get_multi([getResourceDayOccupancyKey(resourceID, reservationDate) 
+                                                             for reservationDate in reservationDates]) if occupancy]
+    occupanciesByKey = dict((occupancy.key, occupancy) for occupancy in occupancies)
+    for reservation in reservations:
+        occupancy = occupanciesByKey.get(getResourceDayOccupancyKey(resourceID, reservation.date))
+        if occupancy:
+            startMinutes, endMinutes = getReservationMinutes(reservation)
+            removeIntervalFromOccupancy(occupancy, startMinutes, endMinutes)
+    ndb.delete_multi([reservation.key for reservation in reservations] + 
+                     [getReservationReminderKey(reservation) for reservation in reservations])
+    ndb.put_multi(occupancies)
+    enqueueUsageRollupUpdate(resourceID, reservationDates, transactional=True)
+
+def getUsageRollupKey(resourceID, period, periodStart):
+    """ Returns the key of the usage rollup of a resource for the 'day' or 'week' starting at periodStart, which belongs 
+    to the entity group of the resource like its reservations """
+    return ndb.Key(Resource, resourceID, ResourceUsageRollup, period + ':' + str(periodStart))
+
+def getWeekStart(reservationDate):
+    """ Returns the Monday of the week of a date """
+    return reservationDate - timedelta(days = reservationDate.weekday())
+
+def enqueueUsageRollupUpdate(resourceID, reservationDates, transactional=False):
+    """ Queues the update of the usage rollups of a resource for the dates on which its reservations changed """
+    taskqueue.add(url='/tasks/updateUsageRollups', transactional=transactional,
+                  params={'resourceID': resourceID, 'date': [str(reservationDate) for reservationDate in sorted(set(reservationDates))]})
+
+def calculateDailyUsage(rollup, reservations):
+    """ Fills a daily usage rollup with the number of bookings, reserved minutes and peak number of reservations in 
+    progress at the same time, for the whole day and for each of its hours, from the reservations of that day """
+    reservationMinutes = [getReservationMinutes(reservation) for reservation in reservations]
+    startMinutes = sorted(start for start, end in reservationMinutes)
+    endMinutes = sorted(end for start, end in reservationMinutes)
+    rollup.bookings = len(reservationMinutes)
+    rollup.reservedMinutes = sum(end - start for start, end in reservationMinutes)
+    rollup.peakConcurrency = calculateMaximumOccupancy(startMinutes, endMinutes, 0, 2*MINUTES_PER_DAY)
+    rollup.hourlyBookings = [0] * 24
+    rollup.hourlyReservedMinutes = [0] * 24
+    for start, end in reservationMinutes:
+        if start < MINUTES_PER_DAY:
+            rollup.hourlyBookings[start//60] += 1
+        for hour in range(start//60, min((end + 59)//60, 24)):
+            rollup.hourlyReservedMinutes[hour] += max(min(end, hour*60 + 60) - max(start, hour*60), 0)
+    rollup.hourlyPeakConcurrency = [calculateMaximumOccupancy(startMinutes, endMinutes, hour*60, hour*60 + 60) for hour in range(24)]
+
+@ndb.transactional
+def updateDailyUsageRollup(resourceID, reservationDate, resource):
+    """ Recomputes the usage rollup of a resource for a date from its current and archived reservations of that date. 
+    The rollup is recomputed rather than adjusted, in a transaction on the entity group of the reservations, so that 
+    retried, duplicated or reordered updates all leave it consistent with them. The resource is looked up by the 
+    caller, since resources not stored under their ID live outside that entity group """
+    resourceKey = ndb.Key(Resource, resourceID)
+    reservationsFuture = Reservation.query(Reservation.date == reservationDate, ancestor=resourceKey).fetch_async()
+    archivedReservationsFuture = ArchivedReservation.query(ArchivedReservation.date == reservationDate, ancestor=resourceKey).fetch_async()
+    reservations = reservationsFuture.get_result() + archivedReservationsFuture.get_result()
+    rollupKey = getUsageRollupKey(resourceID, 'day', reservationDate)
+    if resource is None or not reservations:
+        rollupKey.delete()
+        return
+    availableStartMinutes, availableEndMinutes = getResourceAvailableMinutes(resource)
+    rollup = ResourceUsageRollup(key=rollupKey, resourceID=resourceID, resourceName=resource.resourceName, period='day', 
+                                 periodStart=reservationDate, capacity=resource.capacity, 
+                                 availableMinutes=availableEndMinutes - availableStartMinutes)
+    calculateDailyUsage(rollup, reservations)
+    rollup.put()
+
+@ndb.transactional
+def updateWeeklyUsageRollup(resourceID, weekStart):
+    """ Recomputes the usage rollup of a resource for the week starting at weekStart from its daily rollups """
+    dailyRollups = [dailyRollup for dailyRollup in ndb.get_multi([getUsageRollupKey(resourceID, 'day', weekStart + timedelta(days = day)) 
+                                                                  for day in range(7)]) if dailyRollup]
+    rollupKey = getUsageRollupKey(resourceID, 'week', weekStart)
+    if not dailyRollups:
+        rollupKey.delete()
+        return
+    ResourceUsageRollup(key=rollupKey, resourceID=resourceID, resourceName=dailyRollups[-1].resourceName, period='week', 
+                        periodStart=weekStart, capacity=dailyRollups[-1].capacity, 
+                        availableMinutes=7*dailyRollups[-1].availableMinutes,
+                        bookings=sum(dailyRollup.bookings for dailyRollup in dailyRollups),
+                        reservedMinutes=sum(dailyRollup.reservedMinutes for dailyRollup in dailyRollups),
+                        peakConcurrency=max(dailyRollup.peakConcurrency for dailyRollup in dailyRollups)).put()
+
+def updateUsageRollups(resourceID, reservationDates):
+    """ Recomputes the daily usage rollups of a resource for the requested dates, then the weekly rollups containing them """
+    resource = getResourceByResourceID(resourceID)
+    for reservationDate in sorted(set(reservationDates)):
+        updateDailyUsageRollup(resourceID, reservationDate, resource)
+    for weekStart in sorted(set(getWeekStart(reservationDate) for reservationDate in reservationDates)):
+        updateWeeklyUsageRollup(resourceID, weekStart)
+
+def describeUsageRollup(rollup):
+    """ Returns the figures of a usage rollup served to dashboards, including the share of the available 
+    capacity of the resource that was reserved """
+    availableCapacityMinutes = rollup.capacity * rollup.availableMinutes
+    description = {
+        'resourceID': rollup.resourceID,
+        'resourceName': rollup.resourceName,
+        'period': rollup.period,
+        'periodStart': str(rollup.periodStart),
+        'bookings': rollup.bookings,
+        'reservedMinutes': rollup.reservedMinutes,
+        'peakConcurrency': rollup.peakConcurrency,
+        'capacity': rollup.capacity,
+        'utilisation': round(float(rollup.reservedMinutes) / availableCapacityMinutes, 4) if availableCapacityMinutes else None
+    }
+    if rollup.period == 'day':
+        description['hourly'] = [{'hour': hour, 'bookings': bookings, 'reservedMinutes': reservedMinutes, 'peakConcurrency': peakConcurrency} 
+                                 for hour, (bookings, reservedMinutes, peakConcurrency) 
+                                 in enumerate(zip(rollup.hourlyBookings, rollup.hourlyReservedMinutes, rollup.hourlyPeakConcurrency))]
+    return description
+
+def deleteReservation(reservation):
+    """ Deletes a reservation along with its reminder and its entries in the occupancy index and cached listings """
+    deleteReservations([reservation])
+
+def deleteReservations(reservations):
+    """ Deletes reservations along with their reminders and their entries in the occupancy indexes and cached listings. 
+    The reservations of each resource are deleted together with their reminders in one transaction. Reservations 
+    not rekeyed under their resource yet are deleted outside it, since the occupancy indexes never count them """
+    reservationsByResource = {}
+    reservationsByOwner = {}
+    for reservation in reservations:
+        reservationsByResource.setdefault(reservation.resourceID, []).append(reservation)
+        reservationsByOwner.setdefault(reservation.ownerID, []).append(reservation)
+    for resourceID, resourceReservations in reservationsByResource.iteritems():
+        resourceKey = ndb.Key(Resource, resourceID)
+        rekeyedReservations = [reservation for reservation in resourceReservations if reservation.key.parent() == resourceKey]
+        legacyReservations = [reservation for reservation in resourceReservations if reservation.key.parent() != resourceKey]
+        if rekeyedReservations:
+            removeReservationsOfResource(resourceID, rekeyedReservations)
+        ndb.delete_multi([reservation.key for reservation in legacyReservations] + 
+                         [getReservationReminderKey(reservation) for reservation in legacyReservations])
+        invalidateResourceFeed(resourceID)
+        invalidateFreeSlots(resourceID, [reservation.date for reservation in resourceReservations])
+    for ownerID, ownerReservations in reservationsByOwner.iteritems():
+        invalidateReservationCaches(ownerID)
+        removeReservationsFromDashboard(ownerID, ownerReservations)
+
+@ndb.tasklet
+def getOwnerReservationsPageAsync(resourceOwnerID, cursor=None, pageSize=DEFAULT_PAGE_SIZE, startDate=None, endDate=None):
+    """ Returns a future for a page of the upcoming reservations of all resources owned by the user with the requested 
+    resourceOwnerID, optionally only those dated from startDate up to and including endDate, merged in order of 
+    reservation date and time, and the urlsafe cursor of the next page """
+    startDate, endDate = getReservationDateWindow(startDate, endDate)
+    query = filterReservationDates(Reservation.query(Reservation.resourceOwnerID == str(resourceOwnerID)), startDate, endDate)
+    reservations, nextCursor, more = yield query.order(Reservation.date, Reservation.startDateTime).fetch_page_async(
+        pageSize, start_cursor=cursor)
+    raise ndb.Return((collectUpcomingReservationsOnly(reservations), nextCursor.urlsafe() if more and nextCursor else None))
+
+def calculateMaximumOccupancy(startMinutes, endMinutes, windowStart, windowEnd):
+    """ Returns the maximum number of reservations that are in progress at the same time during the
+    window [windowStart, windowEnd). Both lists are expected to be sorted. Reservations ending at a 
+    minute are released before reservations starting at that same minute are counted """
+    occupied = bisect.bisect_right(startMinutes, windowStart) - bisect.bisect_right(endMinutes, windowStart)
+    maximumOccupancy = occupied
+    startIndex = bisect.bisect_right(startMinutes, windowStart)
+    endIndex = bisect.bisect_right(endMinutes, windowStart)
+    while startIndex < len(startMinutes) and startMinutes[startIndex] < windowEnd:
+        if endIndex < len(endMinutes) and endMinutes[endIndex] <= startMinutes[startIndex]:
+            occupied -= 1
+            endIndex += 1
+        else:
+            occupied += 1
+            startIndex += 1
+            maximumOccupancy = max(maximumOccupancy, occupied)
+    return maximumOccupancy
+
 def hasResourceReachedCapacity(resourceID, requestedDate, requestedStartTime, endTimeArray, capacity):
-    """ Checks if the resource has reached capacity of reservations allowed to exist at the same time """  
-    currentResourceReservations = getReservationsByResourceID(resourceID)
-    requestedDateStartTimeFormatted = formatToDateTime(requestedDate, requestedStartTime)
-    requestedDateEndTimeFormatted = formatToDateTime(requestedDate, endTimeArray)
+    """ Checks if the resource has reached capacity of reservations allowed to exist at the same time
+    at any point during the requested time. An occupancy index not built yet is built without being stored, 
+    since this check runs outside the booking transaction """  
+    reservationDate = formatOnlyDate(requestedDate).date()
+    occupancy = getResourceDayOccupancies(resourceID, [reservationDate])[reservationDate]
+    maximumOccupancy = calculateMaximumOccupancy(occupancy.startMinutes, occupancy.endMinutes,
+                                                 convertTimeToMinutes(requestedStartTime), convertTimeToMinutes(endTimeArray))
+    return maximumOccupancy >= capacity
+
+def calculateMaximumOccupancyByResource(reservations, windowStart, windowEnd):
+    """ Returns a dictionary of resourceID to the maximum number of its reservations in progress at the
+    same time during the window [windowStart, windowEnd). All resources are computed in a single pass
+    over the reservations using per-minute occupancy arrays covering only the requested window """
+    windowLength = windowEnd - windowStart
+    occupancyChangesByResource = {}
+    for reservation in reservations:
+        startMinutes, endMinutes = getReservationMinutes(reservation)
+        startOffset = max(startMinutes, windowStart) - windowStart
+        endOffset = min(endMinutes, windowEnd) - windowStart
+        if startOffset >= endOffset:
+            continue
+        occupancyChanges = occupancyChangesByResource.get(reservation.resourceID)
+        if occupancyChanges is None:
+            occupancyChanges = [0] * (windowLength + 1)
+            occupancyChangesByResource[reservation.resourceID] = occupancyChanges
+        occupancyChanges[startOffset] += 1
+        occupancyChanges[endOffset] -= 1
     
-    overlappingReservations = 0
-    requestedDateFormatted = formatOnlyDate(requestedDate)
+    maximumOccupancyByResource = {}
+    for resourceID, occupancyChanges in occupancyChangesByResource.iteritems():
+        occupied = 0
+        maximumOccupancy = 0
+        for change in occupancyChanges:
+            occupied += change
+            if occupied > maximumOccupancy:
+                maximumOccupancy = occupied
+        maximumOccupancyByResource[resourceID] = maximumOccupancy
+    return maximumOccupancyByResource
+
+def getAvailableResources(requestedDate, requestedStartMinutes, requestedEndMinutes):
+    """ Returns all resources that are open during the requested time and have not reached capacity for it.
+    Resources and the reservations of the requested date are fetched with one query each, in parallel """
+    resourcesFuture = Resource.query().fetch_async()
+    reservationsFuture = Reservation.query(Reservation.date == formatOnlyDate(requestedDate).date()).fetch_async()
+    maximumOccupancyByResource = calculateMaximumOccupancyByResource(reservationsFuture.get_result(),
+                                                                     requestedStartMinutes, requestedEndMinutes)
+    availableResources = []
+    for resource in resourcesFuture.get_result():
+        availableStartMinutes, availableEndMinutes = getResourceAvailableMinutes(resource)
+        if requestedStartMinutes < availableStartMinutes:
+            continue
+        if requestedEndMinutes > availableEndMinutes:
+            continue
+        if maximumOccupancyByResource.get(resource.id, 0) >= resource.capacity:
+            continue
+        availableResources.append(resource)
+    return availableResources
+
+def calculateFreeWindows(startMinutes, endMinutes, windowStart, windowEnd, capacity):
+    """ Returns the start, end and least remaining capacity of every maximal window within [windowStart, windowEnd) 
+    during which fewer than capacity reservations are in progress, so any time inside such a window can be booked. 
+    The occupancy of every minute is the prefix sum of the reservation starts and ends, clipped to the window """
+    occupancyChanges = [0] * (windowEnd - windowStart + 1)
+    for minute in startMinutes:
+        occupancyChanges[min(max(minute, windowStart), windowEnd) - windowStart] += 1
+    for minute in endMinutes:
+        occupancyChanges[min(max(minute, windowStart), windowEnd) - windowStart] -= 1
     
-    for reservation in currentResourceReservations:
-        if reservation.date == requestedDateFormatted.date():
-            reservationDateStartTimeFormatted = formatToDateTime(str(reservation.date), reservation.startTime)
-            reservationDateEndTimeFormatted = formatToDateTime(str(reservation.date), reservation.endTime)
-            
-            if reservationDateStartTimeFormatted == requestedDateStartTimeFormatted:
-                overlappingReservations +=1
-            elif reservationDateStartTimeFormatted < requestedDateStartTimeFormatted:
-                if reservationDateEndTimeFormatted > requestedDateStartTimeFormatted:
-                    overlappingReservations +=1
-            elif reservationDateStartTimeFormatted > requestedDateStartTimeFormatted:
-                if reservationDateStartTimeFormatted < requestedDateEndTimeFormatted:
-                    overlappingReservations +=1
-        
-    if overlappingReservations == capacity:
-        return True
-    else:
-        return False
+    freeWindows = []
+    occupied = 0
+    freeWindowStart = None
+    for minute in range(windowStart, windowEnd + 1):
+        if minute < windowEnd:
+            occupied += occupancyChanges[minute - windowStart]
+        if minute < windowEnd and occupied < capacity:
+            if freeWindowStart is None:
+                freeWindowStart = minute
+                remainingCapacity = capacity - occupied
+            else:
+                remainingCapacity = min(remainingCapacity, capacity - occupied)
+        elif freeWindowStart is not None:
+            freeWindows.append((freeWindowStart, minute, remainingCapacity))
+            freeWindowStart = None
+    return freeWindows
+
+def formatMinutesAsTime(minutes):
+    """ Converts a number of minutes since midnight to string value of time in H:MM format """
+    return '%d:%02d' % (minutes//60, minutes%60)
+
+def getFreeWindowsByDate(resource, reservationDates):
+    """ Returns a dictionary of each of the sorted reservationDates to the free windows of the resource on that date 
+    within its available hours """
+    availableStartMinutes, availableEndMinutes = getResourceAvailableMinutes(resource)
+    computedFor = (resource.capacity, availableStartMinutes, availableEndMinutes)
+    cacheKeys = dict((reservationDate, 'freeSlots:' + resource.id + ':' + str(reservationDate)) for reservationDate in reservationDates)
+    cachedWindows = memcache.get_multi(cacheKeys.values())
+    freeWindowsByDate = {}
+    for reservationDate in reservationDates:
+        cachedValue = cachedWindows.get(cacheKeys[reservationDate])
+        recordCacheLookup(cachedValue is not None and cachedValue[0] == computedFor)
+        if cachedValue is not None and cachedValue[0] == computedFor:
+            freeWindowsByDate[reservationDate] = cachedValue[1]
+    
+    missingDates = [reservationDate for reservationDate in reservationDates if reservationDate not in freeWindowsByDate]
+    if missingDates:
+        occupancies = getResourceDayOccupancies(resource.id, missingDates)
+        for reservationDate in missingDates:
+            occupancy = occupancies[reservationDate]
+            freeWindowsByDate[reservationDate] = calculateFreeWindows(occupancy.startMinutes, occupancy.endMinutes, 
+                                                                      availableStartMinutes, availableEndMinutes, resource.capacity)
+        memcache.set_multi(dict((cacheKeys[reservationDate], (computedFor, freeWindowsByDate[reservationDate])) 
+                                for reservationDate in missingDates), time=CACHE_EXPIRY_SECONDS)
+    return freeWindowsByDate
 
 def checkClashWithOtherReservationsOfUser(requestedDate, requestedStartTime, endTimeArray, user):
-    """ Checks if the reservation time requested by the user overlaps with another reservation already made by the same user """  
-    userReservations = getReservationsByUserID(user.user_id())
-    requestedDateStartTimeFormatted = formatToDateTime(requestedDate, requestedStartTime)
-    requestedDateEndTimeFormatted = formatToDateTime(requestedDate, endTimeArray)    
-    requestedDateFormatted = formatOnlyDate(requestedDate)
+    """ Returns the reservations already made by the user that overlap with the requested reservation time, if any. 
+    Only the upcoming reservations of the user on the requested date are fetched, and the overlapping ones are 
+    found with a binary search over them """  
+    reservationDate = formatOnlyDate(requestedDate).date()
+    userReservations = getReservationsByUserID(user.user_id(), reservationDate, reservationDate)
+    reservationIndex = IntervalIndex(getReservationMinutes(reservation) + (reservation,) for reservation in userReservations)
+    return reservationIndex.findOverlapping(convertTimeToMinutes(requestedStartTime), convertTimeToMinutes(endTimeArray))
+
+def separateClashingReservations(reservations, userID):
+    """ Separates new reservations of a user that overlap with another reservation of the user from those that do not. 
+    The stored reservations of the user are fetched with a single query bounded by the requested dates and indexed 
+    by date, and an earlier new reservation takes precedence over a later one overlapping with it. Returns the 
+    reservations that do not clash, and a dictionary of the reservationID of each one that does to the reservations 
+    it overlaps with """
+    if not reservations:
+        return [], {}
+    reservationDates = [reservation.date for reservation in reservations]
+    storedReservations = Reservation.query(Reservation.ownerID == userID, Reservation.date >= min(reservationDates),
+                                           Reservation.date <= max(reservationDates)).fetch()
+    reservationIndexes = buildIntervalIndexes((storedReservation.date,) + getReservationMinutes(storedReservation) + (storedReservation,)
+                                              for storedReservation in storedReservations)
     
-    for reservation in userReservations:
-        if reservation.date == requestedDateFormatted.date():
-            reservationDateStartTimeFormatted = formatToDateTime(str(reservation.date), reservation.startTime)
-            reservationDateEndTimeFormatted = formatToDateTime(str(reservation.date), reservation.endTime)
-            
-            if reservationDateStartTimeFormatted == requestedDateStartTimeFormatted:
-                return True
-            elif reservationDateStartTimeFormatted < requestedDateStartTimeFormatted:
-                if reservationDateEndTimeFormatted > requestedDateStartTimeFormatted:
-                    return True
-            elif reservationDateStartTimeFormatted > requestedDateStartTimeFormatted:
-                if reservationDateStartTimeFormatted < requestedDateEndTimeFormatted:
-                    return True
-        
-    return False
+    acceptedReservations = []
+    clashingReservations = {}
+    for reservation in reservations:
+        startMinutes, endMinutes = getReservationMinutes(reservation)
+        reservationIndex = reservationIndexes.setdefault(reservation.date, IntervalIndex())
+        overlappingReservations = reservationIndex.findOverlapping(startMinutes, endMinutes)
+        if overlappingReservations:
+            clashingReservations[reservation.reservationID] = overlappingReservations
+        else:
+            reservationIndex.add(startMinutes, endMinutes, reservation)
+            acceptedReservations.append(reservation)
+    return acceptedReservations, clashingReservations
+
+def buildReservation(resource, user, requestedDate, startTimeArray, durationArray):
+    """ Returns a new reservation of a resource by the user, which has not been stored yet """
+    reservationID = str(uuid.uuid4())
+    reservation = Reservation(key=getReservationKey(resource.id, reservationID))
+    reservation.reservationID = reservationID
+    reservation.date = formatOnlyDate(requestedDate).date()
+    reservation.startTime = ':'.join(startTimeArray)
+    reservation.endTime = calculateEndTimeArray(startTimeArray, durationArray)
+    reservation.duration = ':'.join(durationArray)
+    reservation.resourceID = resource.id
+    reservation.resourceName = resource.resourceName
+    reservation.ownerEmail = str(user.email())
+    reservation.ownerID = str(user.user_id())
+    reservation.resourceOwnerID = resource.ownerID
+    return reservation
+
+def getRequestedSlots(request):
+    """ Returns the date and start time of every slot requested for a bulk reservation. Slots are either listed as 
+    'slot' values in YYYY-MM-DD H:M format, or repeat 'reservationDate' and 'startTime' 'occurrences' times 
+    with a 'daily' or 'weekly' 'recurrence'. Raises ValueError for more than BULK_RESERVATION_LIMIT slots, 
+    before building any of them """
+    listedSlots = request.get_all('slot')
+    if listedSlots:
+        if len(listedSlots) > BULK_RESERVATION_LIMIT:
+            raise ValueError("More than " + str(BULK_RESERVATION_LIMIT) + " slots were requested")
+        slots = [tuple(slot.split()) for slot in listedSlots]
+    else:
+        occurrences = int(request.get('occurrences'))
+        if occurrences > BULK_RESERVATION_LIMIT:
+            raise ValueError("More than " + str(BULK_RESERVATION_LIMIT) + " occurrences were requested")
+        firstDate = formatOnlyDate(request.get('reservationDate')).date()
+        interval = timedelta(days = RECURRENCE_INTERVAL_DAYS[request.get('recurrence')])
+        slots = [(str(firstDate + interval*occurrence), request.get('startTime')) for occurrence in range(occurrences)]
+    for slot in slots:
+        formatToDateTime(*slot)
+    return slots
 
 class LandingPage(webapp2.RequestHandler):
     
@@ -181,19 +1546,15 @@ class LandingPage(webapp2.RequestHandler):
         """ Generates the home page of the application """
         user = users.get_current_user()
         if user:      
-            allResources = getAllResources()
-            userResources = getUserResourcesByUserID(user.user_id())
-            userReservations = getReservationsByUserID(user.user_id())
             url = users.create_logout_url(self.request.uri)
             template_values = {               
                 'user': user,
-                'allResources': allResources,
-                'userResources': userResources,
-                'userReservations': userReservations,
                 'url': url,               
                 'displayAllSections': True,
+                'pageBaseUrl': '/?',
                 'width':14          
             }
+            template_values.update(getListingTemplateValues(self.request, user.user_id(), True))
             template = JINJA_ENVIRONMENT.get_template('index.html')
             self.response.write(template.render(template_values))
             
@@ -209,20 +1570,20 @@ class UserPage(webapp2.RequestHandler):
             user = users.get_current_user()
             if user:
                 ownerID = self.request.get('value')
-                userResources = getUserResourcesByUserID(ownerID)
-                userReservations = getReservationsByUserID(ownerID)
-                for reservation in userReservations:
+                listingValues = getListingTemplateValues(self.request, ownerID, False)
+                ownerEmail = ownerID
+                for reservation in listingValues['userReservations']:
                     ownerEmail = reservation.ownerEmail
                     break
                 url = users.create_logout_url(self.request.uri)
                 template_values = {
                     'user': ownerEmail,
-                    'userResources': userResources,
-                    'userReservations': userReservations,
                     'url': url,
                     'displayAllSections': False,
+                    'pageBaseUrl': '/userPage?value=' + ownerID + '&',
                     'width':25              
                 }
+                template_values.update(listingValues)
                 template = JINJA_ENVIRONMENT.get_template('index.html')
                 self.response.write(template.render(template_values))
             
@@ -263,8 +1624,9 @@ class CreateResource(webapp2.RequestHandler):
             for tag in tempTagsArray:
                 tagsSet.add(tag.strip())
             
-            resource = Resource()
-            resource.id = str(uuid.uuid4())
+            resourceID = str(uuid.uuid4())
+            resource = Resource(key=ndb.Key(Resource, resourceID))
+            resource.id = resourceID
             resource.resourceName = resourceName
             resource.ownerID = str(users.get_current_user().user_id())
             resource.availableStartTime = availableStartTime
@@ -274,10 +1636,11 @@ class CreateResource(webapp2.RequestHandler):
             if description and description.strip():
                     resource.description = description.strip()
             if avatar:
-                avatar = images.resize(avatar, 32, 32)
-                resource.avatar = avatar
+                resource.avatarThumbnails = storeAvatarThumbnails(avatar)
             
-            resource.put()
+            putResource(resource)
+            invalidateResourceCaches(resource)
+            updateTagCounts(resource.tags, [])
             url = users.create_logout_url(self.request.uri)
             template_values = {
                 'resource': resource,
@@ -360,6 +1723,7 @@ class EditResource(webapp2.RequestHandler):
                 tagsSet.add(tag.strip())
             
             resource = getResourceByResourceID(rid)
+            previousTags = list(resource.tags)
             resource.resourceName = resourceName
             resource.availableStartTime = availableStartTime
             resource.availableEndTime = availableEndTime
@@ -370,27 +1734,25 @@ class EditResource(webapp2.RequestHandler):
             else:
                 resource.description = None
             if avatar:
-                avatar = images.resize(avatar, 32, 32)
-                resource.avatar = avatar
+                resource.avatarThumbnails = storeAvatarThumbnails(avatar)
+                resource.avatar = None
                 
-            resource.put()
+            putResource(resource)
+            invalidateResourceCaches(resource, previousTags)
+            updateTagCounts(resource.tags, previousTags)
             
             message = resource.resourceName + " has been edited."
-            allResources = getAllResources()
-            userResources = getUserResourcesByUserID(user.user_id())
-            userReservations = getReservationsByUserID(user.user_id())
             
             url = users.create_logout_url(self.request.uri)
             template_values = {
                 'user': user,
-                'allResources': allResources,
-                'userResources': userResources,
-                'userReservations': userReservations,
                 'url': url,
                 'displayAllSections': True,
+                'pageBaseUrl': '/?',
                 'width':14,
                 'message': message      
             }
+            template_values.update(getListingTemplateValues(self.request, user.user_id(), True))
             template = JINJA_ENVIRONMENT.get_template('index.html')
             self.response.write(template.render(template_values))        
             
@@ -456,48 +1818,270 @@ class CreateReservation(webapp2.RequestHandler):
                         self.response.write(template.render(template_values))
                 
                 else:            
-                    if checkClashWithOtherReservationsOfUser(requestedDate, requestedStartTime, endTimeArray, user):
+                    clashingReservations = checkClashWithOtherReservationsOfUser(requestedDate, requestedStartTime, endTimeArray, user)
+                    if clashingReservations:
                         template_values = {
                         'resource': resource,
                         'url': url,
-                        'message': "You already have a reservation at the requested time. No overlapping reservations allowed!"  
+                        'message': "You already have a reservation at the requested time (" + 
+                                   ", ".join(clashingReservation.resourceName + " at " + clashingReservation.startTime 
+                                             for clashingReservation in clashingReservations) + 
+                                   "). No overlapping reservations allowed!"  
                         }
                         template = JINJA_ENVIRONMENT.get_template('createReservation.html')
                         self.response.write(template.render(template_values))
                     else:
-                        reservation = Reservation()
-                        reservation.reservationID = str(uuid.uuid4())
-                        reservation.date = formatOnlyDate(requestedDate).date()
-                        reservation.startTime = ':'.join(startTimeArray)
-                        reservation.endTime = endTimeArray
-                        reservation.duration = ':'.join(durationArray)
-                        reservation.resourceID = rid
-                        reservation.resourceName = resource.resourceName
-                        reservation.ownerEmail = str(user.email())
-                        reservation.ownerID = str(user.user_id())
-                        reservation.put()
-                        resource.lastReservationTime = datetime.now()
-                        resource.numberOfTimesReserved += 1
-                        resource.put()
-                        try:
-                            sendReservationBookedEmail(reservation)
-                        except:
-                            logging.exception('')
-                        message="The reservation has been made."
-                        template_values = {
+                        reservation = buildReservation(resource, user, requestedDate, startTimeArray, durationArray)
+                        bookedResource = bookReservation(reservation, resource)
+                        if bookedResource is None:
+                            errorMessage = resource.resourceName + " has reached capacity for the requested time!"
+                            template_values = {
                             'resource': resource,
-                            'url': url,
-                            'enableEditingResource': True,
-                            'width': 20,
-                            'message': message
-                        }
-                        template = JINJA_ENVIRONMENT.get_template('resourcePage.html')
-                        self.response.write(template.render(template_values))   
+                            'message': errorMessage,
+                            'url': url
+                            }
+                            template = JINJA_ENVIRONMENT.get_template('createReservation.html')
+                            self.response.write(template.render(template_values))
+                        else:
+                            resource = bookedResource
+                            invalidateResourceCaches(resource)
+                            invalidateReservationCaches(reservation.ownerID)
+                            invalidateResourceFeed(rid)
+                            invalidateFreeSlots(rid, [reservation.date])
+                            message="The reservation has been made."
+                            template_values = {
+                                'resource': resource,
+                                'url': url,
+                                'enableEditingResource': True,
+                                'width': 20,
+                                'message': message
+                            }
+                            template = JINJA_ENVIRONMENT.get_template('resourcePage.html')
+                            self.response.write(template.render(template_values))   
                
         else:
             url = users.create_login_url(self.request.uri)
             self.redirect(url)
 
+class CreateBulkReservation(webapp2.RequestHandler):
+    
+    def post(self):
+        """ Books several slots of a resource with the same 'duration' in one request and returns the outcome of 
+        every slot as JSON. The slots are given as described in getRequestedSlots. In 'allOrNothing' mode, the default, 
+        no slot is booked unless all of them can be, while in 'bestEffort' mode every slot that can be booked is. 
+        Clashes with other reservations of the user and the capacity of the resource are validated for all 
+        slots in one pass, so the work does not grow with the number of slots already booked """
+        user = users.get_current_user()
+        if not user:
+            self.redirect(users.create_login_url(self.request.uri))
+            return
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        resourceID = self.request.get('resourceID')
+        resource = getResourceByResourceID(resourceID) if resourceID else None
+        allOrNothing = self.request.get('mode', 'allOrNothing') != 'bestEffort'
+        try:
+            slots = getRequestedSlots(self.request)
+            durationArray = calculateRequestedTimeArray(self.request.get('duration'))
+            convertTimeToMinutes(self.request.get('duration'))
+        except (ValueError, TypeError, KeyError, IndexError):
+            slots = None
+        if resource is None or not slots:
+            self.response.set_status(400)
+            self.response.write(json.dumps({'message': "A resource and between 1 and " + str(BULK_RESERVATION_LIMIT) 
+                                            + " valid slots with a duration are required"}))
+            return
+        
+        outcomes = {}
+        reservations = []
+        for requestedDate, requestedStartTime in slots:
+            reservation = buildReservation(resource, user, requestedDate, calculateRequestedTimeArray(requestedStartTime), durationArray)
+            reservations.append(reservation)
+            if hasReservationTimePassed(requestedDate, requestedStartTime):
+                outcomes[reservation.reservationID] = 'elapsed'
+        acceptedReservations, clashingReservations = separateClashingReservations(
+            [reservation for reservation in reservations if reservation.reservationID not in outcomes], user.user_id())
+        for reservationID in clashingReservations:
+            outcomes[reservationID] = 'clash'
+        
+        bookedReservations = []
+        if acceptedReservations and not (allOrNothing and outcomes):
+            bookedReservations, fullReservations, bookedResource = bookReservations(acceptedReservations, resource, allOrNothing)
+            for reservation in fullReservations:
+                outcomes[reservation.reservationID] = 'capacity'
+            for reservation in bookedReservations:
+                outcomes[reservation.reservationID] = 'booked'
+        
+        if bookedReservations:
+            invalidateResourceCaches(bookedResource)
+            invalidateReservationCaches(str(user.user_id()))
+            invalidateResourceFeed(resource.id)
+            invalidateFreeSlots(resource.id, [reservation.date for reservation in bookedReservations])
+        
+        self.response.write(json.dumps({
+            'mode': 'allOrNothing' if allOrNothing else 'bestEffort',
+            'booked': len(bookedReservations),
+            'slots': [{'date': str(reservation.date), 
+                       'startTime': reservation.startTime,
+                       'endTime': reservation.endTime,
+                       'reservationID': reservation.reservationID if outcomes.get(reservation.reservationID) == 'booked' else None,
+                       'clashesWith': [clashingReservation.reservationID 
+                                       for clashingReservation in clashingReservations.get(reservation.reservationID, [])],
+                       'outcome': outcomes.get(reservation.reservationID, 'notBooked')} for reservation in reservations]
+        }))
+
+class OwnerConsole(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Returns, as JSON, a page of the upcoming reservations of all resources owned by the current user in order of 
+        reservation date and time, optionally only those from 'startDate' up to and including 'endDate'. Each 
+        reservation carries the key used to cancel it """
+        user = users.get_current_user()
+        if not user:
+            self.redirect(users.create_login_url(self.request.uri))
+            return
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        try:
+            startDate = formatOnlyDate(self.request.get('startDate')).date() if self.request.get('startDate') else None
+            endDate = formatOnlyDate(self.request.get('endDate')).date() if self.request.get('endDate') else None
+        except ValueError:
+            self.response.set_status(400)
+            self.response.write(json.dumps({'message': "Dates must be in YYYY-MM-DD format"}))
+            return
+        reservations, nextCursor = getOwnerReservationsPageAsync(user.user_id(), getRequestCursor(self.request, 'cursor'), 
+                                                                 getRequestPageSize(self.request), startDate, endDate).get_result()
+        self.response.write(json.dumps({
+            'reservations': [{'key': reservation.key.urlsafe(),
+                              'reservationID': reservation.reservationID,
+                              'resourceID': reservation.resourceID,
+                              'resourceName': reservation.resourceName,
+                              'ownerEmail': reservation.ownerEmail,
+                              'date': str(reservation.date),
+                              'startTime': reservation.startTime,
+                              'endTime': reservation.endTime,
+                              'duration': reservation.duration} for reservation in reservations],
+            'nextCursor': nextCursor
+        }))
+    
+    def post(self):
+        """ Cancels the reservations with the requested 'key' values, as returned by get, that belong to resources owned 
+        by the current user, and returns the outcome as JSON. The reservations are read with one batch get, ownership is 
+        taken from getResourceOwnerIDs, and the reservations of each resource are deleted in one batch """
+        user = users.get_current_user()
+        if not user:
+            self.redirect(users.create_login_url(self.request.uri))
+            return
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        try:
+            reservationKeys = [ndb.Key(urlsafe=urlsafeKey) for urlsafeKey in self.request.get_all('key')]
+        except Exception:
+            reservationKeys = None
+        if not reservationKeys or len(reservationKeys) > MAXIMUM_PAGE_SIZE or any(key.kind() != 'Reservation' for key in reservationKeys):
+            self.response.set_status(400)
+            self.response.write(json.dumps({'message': "Between 1 and " + str(MAXIMUM_PAGE_SIZE) + " reservation keys are required"}))
+            return
+        
+        reservations = [reservation for reservation in ndb.get_multi(reservationKeys) if reservation]
+        resourceOwnerIDs = getResourceOwnerIDs(reservations)
+        cancelledReservations = [reservation for reservation in reservations 
+                                 if resourceOwnerIDs[reservation.reservationID] == str(user.user_id())]
+        if cancelledReservations:
+            deleteReservations(cancelledReservations)
+        self.response.write(json.dumps({
+            'cancelled': [reservation.reservationID for reservation in cancelledReservations],
+            'forbidden': [reservation.reservationID for reservation in reservations 
+                          if resourceOwnerIDs[reservation.reservationID] != str(user.user_id())],
+            'notFound': len(reservationKeys) - len(reservations)
+        }))
+
+class ResourceUsage(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Returns usage figures as JSON, read from the usage rollups. With a 'resourceID', returns the daily rollups, 
+        including hourly figures, and the weekly rollups of the resource for the dates from 'startDate' up to and 
+        including 'endDate', which default to the current date. Without one, returns the most reserved resources of 
+        the week containing 'startDate' """
+        user = users.get_current_user()
+        if not user:
+            self.redirect(users.create_login_url(self.request.uri))
+            return
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        resourceID = self.request.get('resourceID')
+        try:
+            startDate = formatOnlyDate(self.request.get('startDate') or str(getCurrentDateTime().date())).date()
+            endDate = formatOnlyDate(self.request.get('endDate') or str(startDate)).date()
+        except ValueError:
+            endDate = None
+        if endDate is None or endDate < startDate or (endDate - startDate).days >= USAGE_MAXIMUM_DAYS:
+            self.response.set_status(400)
+            self.response.write(json.dumps({'message': "A range of at most " + str(USAGE_MAXIMUM_DAYS) + " dates is required"}))
+            return
+        
+        if not resourceID:
+            weekStart = getWeekStart(startDate)
+            topRollups = ResourceUsageRollup.query(ResourceUsageRollup.period == 'week', ResourceUsageRollup.periodStart == weekStart
+                                                   ).order(-ResourceUsageRollup.reservedMinutes).fetch(USAGE_TOP_RESOURCES_LIMIT)
+            self.response.write(json.dumps({'weekStart': str(weekStart), 'resources': [describeUsageRollup(rollup) for rollup in topRollups]}))
+            return
+        
+        reservationDates = [startDate + timedelta(days = offset) for offset in range((endDate - startDate).days + 1)]
+        weekStarts = sorted(set(getWeekStart(reservationDate) for reservationDate in reservationDates))
+        rollupKeys = ([getUsageRollupKey(resourceID, 'day', reservationDate) for reservationDate in reservationDates] + 
+                      [getUsageRollupKey(resourceID, 'week', weekStart) for weekStart in weekStarts])
+        rollups = [rollup for rollup in ndb.get_multi(rollupKeys) if rollup]
+        self.response.write(json.dumps({
+            'resourceID': resourceID,
+            'days': [describeUsageRollup(rollup) for rollup in rollups if rollup.period == 'day'],
+            'weeks': [describeUsageRollup(rollup) for rollup in rollups if rollup.period == 'week']
+        }))
+
+class FreeSlots(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Returns, as JSON, the windows within the available hours of a resource during which it has capacity left, 
+        for every date from 'startDate' up to and including 'endDate', which default to the current date. Dates before 
+        the current date are skipped, and the windows of the current date start after the current time """
+        user = users.get_current_user()
+        if not user:
+            self.redirect(users.create_login_url(self.request.uri))
+            return
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        resourceID = self.request.get('resourceID')
+        resource = getResourceByResourceID(resourceID) if resourceID else None
+        currentDateTime = getCurrentDateTime()
+        try:
+            startDate = formatOnlyDate(self.request.get('startDate') or str(currentDateTime.date())).date()
+            endDate = formatOnlyDate(self.request.get('endDate') or str(startDate)).date()
+        except ValueError:
+            resource = None
+        if resource is None or endDate < startDate or (endDate - startDate).days >= FREE_SLOTS_MAXIMUM_DAYS:
+            self.response.set_status(400)
+            self.response.write(json.dumps({'message': "A resource and a range of at most " + str(FREE_SLOTS_MAXIMUM_DAYS) 
+                                            + " dates are required"}))
+            return
+        
+        startDate = max(startDate, currentDateTime.date())
+        reservationDates = [startDate + timedelta(days = offset) for offset in range((endDate - startDate).days + 1)]
+        freeWindowsByDate = getFreeWindowsByDate(resource, reservationDates) if reservationDates else {}
+        currentMinutes = currentDateTime.hour*60 + currentDateTime.minute + 1
+        dates = []
+        for reservationDate in reservationDates:
+            freeWindows = freeWindowsByDate[reservationDate]
+            if reservationDate == currentDateTime.date():
+                freeWindows = [(max(windowStart, currentMinutes), windowEnd, remainingCapacity) 
+                               for windowStart, windowEnd, remainingCapacity in freeWindows if windowEnd > currentMinutes]
+            dates.append({
+                'date': str(reservationDate),
+                'windows': [{'startTime': formatMinutesAsTime(windowStart), 
+                             'endTime': formatMinutesAsTime(windowEnd), 
+                             'remainingCapacity': remainingCapacity} for windowStart, windowEnd, remainingCapacity in freeWindows]
+            })
+        self.response.write(json.dumps({'resourceID': resource.id, 'capacity': resource.capacity, 'dates': dates}))
+
 class ViewReservations(webapp2.RequestHandler):
     
     def get(self):
@@ -505,13 +2089,13 @@ class ViewReservations(webapp2.RequestHandler):
         user = users.get_current_user()
         if user:
             rid = self.request.get('value')
-            resource = getResourceByResourceID(rid)
-            resourceReservations = getReservationsByResourceID(rid)
+            resourceFuture = getResourceByResourceIDAsync(rid)
+            resourceReservationsFuture = getReservationsByResourceIDAsync(rid)
             url = users.create_logout_url(self.request.uri)
             
             template_values = {
-                'resource': resource,
-                'reservations': resourceReservations,
+                'resource': resourceFuture.get_result(),
+                'reservations': resourceReservationsFuture.get_result(),
                 'url': url
             }
             template = JINJA_ENVIRONMENT.get_template('viewReservations.html')
@@ -528,24 +2112,19 @@ class DeleteReservation(webapp2.RequestHandler):
         user = users.get_current_user()
         if user:
             reservationID = self.request.get('value')
-            reservations = Reservation.query(Reservation.reservationID == reservationID).fetch()
-            for reservation in reservations:
-                reservation.key.delete()
-                
-            allResources = getAllResources()
-            userResources = getUserResourcesByUserID(user.user_id())
-            userReservations = getReservationsByUserID(user.user_id())
+            reservation = getReservationByReservationID(self.request.get('resourceID'), reservationID)
+            if reservation:
+                deleteReservation(reservation)
             
             url = users.create_logout_url(self.request.uri)
             template_values = {
                 'user': user,
-                'allResources': allResources,
-                'userResources': userResources,
-                'userReservations': userReservations,
                 'url': url,
                 'displayAllSections': True,
+                'pageBaseUrl': '/?',
                 'width':14          
             }
+            template_values.update(getListingTemplateValues(self.request, user.user_id(), True))
             template = JINJA_ENVIRONMENT.get_template('index.html')
             self.response.write(template.render(template_values))           
         
@@ -561,17 +2140,17 @@ class TagPage(webapp2.RequestHandler):
         if user:
             tag = self.request.get('value')
             tag = tag.strip()
-            allResources = Resource.query().fetch()
-            resources=[]
-            for resource in allResources:
-                if tag in resource.tags:
-                    resources.append(resource)
+            pageSize = getRequestPageSize(self.request)
+            resources, nextCursor = getResourcesByTag(tag, getRequestCursor(self.request, 'cursor'), pageSize)
             
             url = users.create_logout_url(self.request.uri)
             
             template_values = {
                 'tag': tag,
                 'resources': resources,
+                'nextCursor': nextCursor,
+                'pageSize': pageSize,
+                'popularTags': getPopularTags(),
                 'url': url
             }
             template = JINJA_ENVIRONMENT.get_template('tagPage.html')
@@ -584,22 +2163,50 @@ class TagPage(webapp2.RequestHandler):
 class RSSPage(webapp2.RequestHandler):
     
     def get(self):
-        """ Generates RSS which displays all upcoming and past/undeleted reservations for an existing resource in an XML format """
+        """ Returns an RSS feed of the latest upcoming and past/undeleted reservations for an existing resource. 
+        The feed is rendered while the reservations are read from the datastore in batches, and is cached until 
+        the next booking or deletion of a reservation of the resource, along with its ETag and the time it last 
+        changed. Conditional requests are answered with 304 when the feed has not changed """
         user = users.get_current_user()
         if user:
             rid = self.request.get('value')
             resource = getResourceByResourceID(rid)
-            resourceReservations = getReservationsByResourceID(rid)
-            resourceReservations = Reservation.query(Reservation.resourceID == rid).order(Reservation.date, Reservation.startTime).fetch()
-            url = users.create_logout_url(self.request.uri)
+            self.response.headers['Content-Type'] = 'application/rss+xml; charset=utf-8'
             
+            cachedFeed = memcache.get('resourceFeed:' + rid)
+            if cachedFeed:
+                etag, feed, lastModified = cachedFeed
+                self.response.headers['ETag'] = etag
+                self.response.headers['Last-Modified'] = formatdate(calendar.timegm(lastModified.timetuple()), usegmt=True)
+                if self.request.headers.get('If-None-Match'):
+                    isNotModified = requestMatchesETag(self.request, etag)
+                else:
+                    isNotModified = requestNotModifiedSince(self.request, lastModified)
+                if isNotModified:
+                    self.response.set_status(304)
+                else:
+                    self.response.write(feed)
+                return
+            
+            lastModified = getResourceFeedModifiedTime(resource)
+            self.response.headers['Last-Modified'] = formatdate(calendar.timegm(lastModified.timetuple()), usegmt=True)
+            reservations = Reservation.query(ancestor=ndb.Key(Resource, rid)).order(-Reservation.date, -Reservation.startDateTime).iter(
+                limit=RSS_MAXIMUM_ITEMS, batch_size=RSS_BATCH_SIZE)
             template_values = {
-                'resourceName': resource.resourceName,
-                'reservations': resourceReservations,
-                'url': url
+                'resource': resource,
+                'reservations': reservations,
+                'host': self.request.host_url
             }
-            template = JINJA_ENVIRONMENT.get_template('RSSPage.html')
-            self.response.write(template.render(template_values))
+            template = JINJA_ENVIRONMENT.get_template('rssFeed.xml')
+            feedChunks = []
+            for chunk in template.generate(template_values):
+                chunk = chunk.encode('utf-8')
+                feedChunks.append(chunk)
+                self.response.write(chunk)
+            feed = ''.join(feedChunks)
+            etag = '"' + hashlib.md5(feed).hexdigest() + '"'
+            self.response.headers['ETag'] = etag
+            memcache.set('resourceFeed:' + rid, (etag, feed, lastModified), time=CACHE_EXPIRY_SECONDS)
             
         else:
             url = users.create_login_url(self.request.uri)
@@ -608,15 +2215,20 @@ class RSSPage(webapp2.RequestHandler):
 class SearchName(webapp2.RequestHandler):
     
     def get(self):
-        """ Generates page to display resource details of resources with a particular case-sensitive name """
+        """ Generates page to display resource details of resources whose name has words starting with 
+        the words searched for, ignoring case. Pages are taken by offset from the ranking of all matching 
+        resources, so each resource appears once, on the page of its rank """
         user = users.get_current_user()
         if user:
             nameToBeSearched = self.request.get('resourceName').strip()
-            resources = Resource.query(Resource.resourceName == nameToBeSearched).fetch()
+            pageSize = getRequestPageSize(self.request)
+            resources, nextOffset = searchResourcesByName(nameToBeSearched, getRequestOffset(self.request, 'offset'), pageSize)
             url = users.create_logout_url(self.request.uri)
             
             template_values = {
                 'resources': resources,
+                'nextPageUrl': '/searchName?' + urllib.urlencode({'resourceName': nameToBeSearched.encode('utf-8'), 
+                                                                  'pageSize': pageSize, 'offset': nextOffset}) if nextOffset else None,
                 'url': url           
             }
             template = JINJA_ENVIRONMENT.get_template('searchResults.html')
@@ -629,31 +2241,170 @@ class SearchName(webapp2.RequestHandler):
 class SendMailViaCron(webapp2.RequestHandler):    
     
     def get(self):
-        """ Sends a reminder email to the user, who booked the reservation, when the reservation starts """
+        """ Sends a reminder email to the user, who booked the reservation, when the reservation starts. The minute 
+        the reminders have been dispatched up to is only advanced once their mails are queued, under a task name 
+        that makes a repeated tick queue them once, so a tick that fails is caught up on by the next one. Reminders 
+        due before the minutes caught up on are deleted without being sent """
         logging.info("In sendmailviacron function!")
-        reservations = Reservation.query().fetch()
-        reservations = collectUpcomingReservationsOnly(reservations)
-        for reservation in reservations:        
-            currentDateTime = datetime.now() - timedelta(hours = 4)
-            requestedDateTimeFormatted = formatToDateTime(str(reservation.date), reservation.startTime)
-            if (requestedDateTimeFormatted.date() == currentDateTime.date()) and (requestedDateTimeFormatted.hour == currentDateTime.hour) and (requestedDateTimeFormatted.minute == currentDateTime.minute):
-                logging.info("Sending mail in sendmailviacron!!!")
-                try:  
-                    sendReservationStartedEmail(reservation)
-                except:
-                    logging.exception('')
+        state = ndb.Key(ReminderDispatcherState, REMINDER_DISPATCHER_ID).get()
+        if state is None:
+            backfillReservationReminders()
+        currentMinute = getCurrentDateTime().replace(second=0, microsecond=0)
+        firstMinute, lastMinute = getUndispatchedReminderMinutes(state, currentMinute)
+        reminders = ReservationReminder.query(ReservationReminder.dueMinute >= firstMinute, 
+                                              ReservationReminder.dueMinute <= lastMinute).fetch()
+        if reminders:
+            logging.info("Queueing " + str(len(reminders)) + " reminder mails in sendmailviacron!!!")
+            enqueueReservationEmails('started', [reminder.reservationKey for reminder in reminders], 
+                                     taskName='reminders-' + firstMinute.strftime('%Y%m%d%H%M') + '-' + lastMinute.strftime('%Y%m%d%H%M'))
+            ndb.delete_multi([reminder.key for reminder in reminders])
+        ndb.delete_multi(ReservationReminder.query(ReservationReminder.dueMinute < firstMinute).fetch(keys_only=True))
+        advanceReminderDispatcher(lastMinute)
         logging.info("Leaving sendmailviacron function!")
 
+class SweepDashboards(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Removes the reservations that have ended from the dashboards of all users """
+        expiredDashboardKeys = UserDashboard.query(UserDashboard.nextExpiryTime <= getCurrentDateTime()).fetch(keys_only=True)
+        for dashboardKey in expiredDashboardKeys:
+            updateUserDashboard(dashboardKey.id(), removeExpiredReservations)
+        logging.info("Swept " + str(len(expiredDashboardKeys)) + " dashboards")
+
+class CursorChainedMigration(webapp2.RequestHandler):
+    """ Base of the handlers that process all entities matching a query in batches of MIGRATION_BATCH_SIZE. get starts 
+    the migration, and each post processes one batch and queues the next with the cursor where the batch stopped, so 
+    that an interrupted migration resumes from the last completed batch. Subclasses set url and parameterNames, the 
+    request parameters passed on from batch to batch, and define getQuery(parameters), which returns the query of the 
+    entities to process, processBatch(entities, parameters) and getStartMessage(parameters), which returns the message 
+    written when the migration is started """
+    url = None
+    parameterNames = ()
+    projection = None
+    
+    def getStartParameters(self):
+        """ Returns the parameters of the migration started by get """
+        return dict((parameterName, self.request.get(parameterName)) for parameterName in self.parameterNames)
+    
+    def get(self):
+        """ Starts the migration """
+        parameters = self.getStartParameters()
+        taskqueue.add(url=self.url, params=parameters)
+        self.response.write(self.getStartMessage(parameters))
+    
+    def post(self):
+        """ Processes one batch and queues the next batch with the cursor where this batch stopped """
+        parameters = dict((parameterName, self.request.get(parameterName)) for parameterName in self.parameterNames)
+        cursor = ndb.Cursor(urlsafe=self.request.get('cursor') or None)
+        entities, nextCursor, more = self.getQuery(parameters).fetch_page(MIGRATION_BATCH_SIZE, start_cursor=cursor, 
+                                                                          projection=self.projection)
+        self.processBatch(entities, parameters)
+        if more and nextCursor:
+            parameters['cursor'] = nextCursor.urlsafe()
+            taskqueue.add(url=self.url, params=parameters)
+
+class ArchiveReservations(CursorChainedMigration):
+    url = '/tasks/archiveReservations'
+    parameterNames = ('archiveBefore',)
+    
+    def getStartParameters(self):
+        """ Returns the date before which reservations are archived, RESERVATION_ARCHIVE_AFTER_DAYS days ago """
+        return {'archiveBefore': str(getCurrentDateTime().date() - timedelta(days = RESERVATION_ARCHIVE_AFTER_DAYS))}
+    
+    def getStartMessage(self, parameters):
+        return "Started archiving reservations dated before " + parameters['archiveBefore']
+    
+    def getQuery(self, parameters):
+        return Reservation.query(Reservation.date < formatOnlyDate(parameters['archiveBefore']).date())
+    
+    def processBatch(self, reservations, parameters):
+        """ Archives a batch of reservations and invalidates the feeds of their resources """
+        archiveReservations(reservations)
+        for resourceID in set(reservation.resourceID for reservation in reservations):
+            invalidateResourceFeed(resourceID)
+        logging.info("Archived " + str(len(reservations)) + " reservations dated before " + parameters['archiveBefore'])
+
+class UpdateUsageRollups(webapp2.RequestHandler):
+    
+    def post(self):
+        """ Recomputes the usage rollups of a resource for the dates on which its reservations changed """
+        reservationDates = [formatOnlyDate(reservationDate).date() for reservationDate in self.request.get_all('date')]
+        updateUsageRollups(self.request.get('resourceID'), reservationDates)
+
+class UpdateDashboard(webapp2.RequestHandler):
+    
+    def post(self):
+        """ Updates the dashboard of a user with the current summaries of the reservations and the resource queued 
+        by enqueueDashboardUpdate. Reservations deleted in the meantime are skipped """
+        userID = self.request.get('userID')
+        reservationKeys = [ndb.Key(urlsafe=urlsafeKey) for urlsafeKey in self.request.get_all('reservationKey')]
+        reservations = [reservation for reservation in ndb.get_multi(reservationKeys) if reservation]
+        if reservations:
+            addReservationsToDashboard(userID, reservations)
+        resource = ndb.Key(urlsafe=self.request.get('resourceKey')).get() if self.request.get('resourceKey') else None
+        if resource:
+            updateResourceInDashboards(resource)
+
+class DeliverMail(webapp2.RequestHandler):
+    
+    def post(self):
+        """ Sends a batch of notification emails queued on the mail queue. Reservations that were deleted 
+        in the meantime are skipped. If any email fails, the task fails and is retried with backoff, 
+        and the emails already sent are not sent again """
+        notification = self.request.get('notification')
+        reservationKeys = [ndb.Key(urlsafe=urlsafeKey) for urlsafeKey in self.request.get_all('reservationKey')]
+        failedDeliveries = 0
+        for reservation in ndb.get_multi(reservationKeys):
+            if reservation is None:
+                continue
+            try:
+                deliverReservationEmail(notification, reservation)
+            except:
+                logging.exception('')
+                failedDeliveries += 1
+        if failedDeliveries:
+            self.response.set_status(500)
+            self.response.write(str(failedDeliveries) + " emails could not be sent")
+
 class GetImage(webapp2.RequestHandler):
     
     def get(self):
-        """ Returns the image associated with a resource, if any """
+        """ Returns an image, requested either by its hash or as the avatar of a resource in one of the 
+        thumbnail sizes. Images are served with their hash as a strong ETag, so a client that already has 
+        the image gets a 304 response without the image being read. Images requested by hash never change 
+        and may be cached for a year """
         user = users.get_current_user()
         if user:
-            rid = self.request.get('value')
-            resource = getResourceByResourceID(rid)
-            self.response.headers['Content-Type'] = 'image/png'
-            self.response.out.write(resource.avatar)
+            imageHash = self.request.get('hash')
+            isImmutable = bool(imageHash)
+            if not imageHash:
+                resource = getResourceByResourceID(self.request.get('value'))
+                size = self.request.get('size')
+                imageHash = getAvatarHash(resource, int(size) if size.isdigit() else DEFAULT_AVATAR_SIZE)
+                if imageHash is None:
+                    if resource.avatar:
+                        self.response.headers['Content-Type'] = detectImageContentType(resource.avatar)
+                        self.response.out.write(resource.avatar)
+                    else:
+                        self.response.set_status(404)
+                    return
+            
+            etag = '"' + imageHash + '"'
+            self.response.headers['ETag'] = etag
+            if isImmutable:
+                self.response.headers['Cache-Control'] = 'private, max-age=' + str(IMAGE_CACHE_MAX_AGE_SECONDS) + ', immutable'
+            else:
+                self.response.headers['Cache-Control'] = 'private, no-cache'
+            if requestMatchesETag(self.request, etag):
+                self.response.set_status(304)
+                return
+            
+            image = ndb.Key(ImageBlob, imageHash).get()
+            if image is None:
+                self.response.set_status(404)
+                return
+            self.response.headers['Content-Type'] = str(image.contentType)
+            self.response.out.write(image.data)
         else:
             url = users.create_login_url(self.request.uri)
             self.redirect(url)
@@ -697,29 +2448,11 @@ class SearchByAvailability(webapp2.RequestHandler):
                 self.response.write(template.render(template_values))
             
             else:
-                listOfAvailableResources=[]
                 startTimeArray = calculateRequestedTimeArray(requestedStartTime)
                 durationArray = calculateRequestedTimeArray(requestedDuration)
-                endTimeArray = calculateEndTimeArray(startTimeArray, durationArray)
-                endTimeInMinutes = int(startTimeArray[0])*60 + int(startTimeArray[1]) + int(durationArray[0])*60 + int(durationArray[1]);
-                allResources = Resource.query().fetch()
-                
-                for resource in allResources:
-                    availableStartTimeArray = resource.availableStartTime.split(":")
-                    availableEndTimeArray = resource.availableEndTime.split(":")
-                    availableEndTimeInMinutes = int(availableEndTimeArray[0])*60 + int(availableEndTimeArray[1])
-                    if startTimeArray[0] < availableStartTimeArray[0]:
-                        continue
-                    elif (startTimeArray[0] == availableStartTimeArray[0]) and (startTimeArray[1] < availableStartTimeArray[1]):
-                        continue
-                    if endTimeInMinutes > availableEndTimeInMinutes:
-                        continue
-                    else:
-                        rid = resource.id                
-                        if hasResourceReachedCapacity(rid, requestedDate, requestedStartTime, endTimeArray, resource.capacity):
-                                continue                        
-                        else:
-                            listOfAvailableResources.append(resource)
+                startTimeInMinutes = int(startTimeArray[0])*60 + int(startTimeArray[1])
+                endTimeInMinutes = startTimeInMinutes + int(durationArray[0])*60 + int(durationArray[1]);
+                listOfAvailableResources = getAvailableResources(requestedDate, startTimeInMinutes, endTimeInMinutes)
                 
                 template_values = {
                     'resources': listOfAvailableResources,
@@ -732,13 +2465,161 @@ class SearchByAvailability(webapp2.RequestHandler):
             url = users.create_login_url(self.request.uri)
             self.redirect(url)
                
-application = webapp2.WSGIApplication([
+class ResaveEntities(CursorChainedMigration):
+    url = '/admin/resaveEntities'
+    parameterNames = ('kind',)
+    
+    def getStartMessage(self, parameters):
+        return "Started re-saving entities of kind " + parameters['kind']
+    
+    def getQuery(self, parameters):
+        return ndb.Query(kind=parameters['kind'])
+    
+    def processBatch(self, entities, parameters):
+        """ Re-saves a batch of entities so that the properties derived from other properties in _pre_put_hook 
+        are backfilled for entities stored before they existed """
+        ndb.put_multi(entities)
+        logging.info("Re-saved " + str(len(entities)) + " entities of kind " + parameters['kind'])
+               
+class CacheStatistics(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Returns the cache hit and miss counters of this instance and the memcache statistics as JSON """
+        with CACHE_STATISTICS_LOCK:
+            statistics = dict(CACHE_STATISTICS)
+        lookups = statistics['hits'] + statistics['misses']
+        statistics['hitRatio'] = float(statistics['hits']) / lookups if lookups else 0.0
+        statistics['memcache'] = memcache.get_stats()
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(statistics))
+               
+class RequestStatistics(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Returns the percentiles of the latency, datastore RPCs, template rendering time and mail calls of 
+        the recent requests of each route handled by this instance as JSON """
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(summarizeRouteStatistics(), sort_keys=True))
+               
+class RekeyEntities(CursorChainedMigration):
+    url = '/admin/rekeyEntities'
+    parameterNames = ('kind',)
+    
+    def getStartMessage(self, parameters):
+        return "Started rekeying entities of kind " + parameters['kind']
+    
+    def getQuery(self, parameters):
+        return ndb.Query(kind=parameters['kind'])
+    
+    def processBatch(self, entities, parameters):
+        """ Copies the entities of a batch, Resource or Reservation, stored under outdated keys to the keys returned by 
+        getCanonicalKey and deletes the originals, along with the occupancy indexes built without the moved reservations. 
+        Entities that already have the right key are left alone, so the migration can be resumed or re-run safely """
+        rekeyedEntities = []
+        obsoleteKeys = []
+        for entity in entities:
+            canonicalKey = getCanonicalKey(entity)
+            if entity.key == canonicalKey:
+                continue
+            rekeyedEntity = type(entity)(key=canonicalKey)
+            rekeyedEntity.populate(**entity.to_dict())
+            rekeyedEntities.append(rekeyedEntity)
+            obsoleteKeys.append(entity.key)
+        movedReservations = [entity for entity in rekeyedEntities if isinstance(entity, Reservation)]
+        ndb.put_multi(rekeyedEntities)
+        createReservationReminders(movedReservations)
+        ndb.delete_multi(obsoleteKeys + list(set(getResourceDayOccupancyKey(reservation.resourceID, reservation.date) 
+                                                 for reservation in movedReservations)))
+        for reservation in movedReservations:
+            invalidateFreeSlots(reservation.resourceID, [reservation.date])
+        logging.info("Rekeyed " + str(len(rekeyedEntities)) + " entities of kind " + parameters['kind'])
+               
+class RebuildTagCounts(webapp2.RequestHandler):
+    
+    def get(self):
+        """ Recomputes the number of resources per tag from the stored resources """
+        tagCounts = {}
+        for resource in Resource.query().iter(projection=[Resource.tags]):
+            tagCounts[resource.tags[0]] = tagCounts.get(resource.tags[0], 0) + 1
+        staleTagCountKeys = [key for key in TagCount.query().fetch(keys_only=True) if key.id() not in tagCounts]
+        ndb.delete_multi(staleTagCountKeys)
+        ndb.put_multi([TagCount(id=tag, tag=tag, count=count) for tag, count in tagCounts.iteritems() if tag])
+        bumpCacheVersion('popularTags')
+        self.response.write("Rebuilt counts of " + str(len(tagCounts)) + " tags")
+               
+class RebuildUsageRollups(CursorChainedMigration):
+    url = '/admin/rebuildUsageRollups'
+    projection = [Resource.id]
+    
+    def getStartMessage(self, parameters):
+        return "Started rebuilding usage rollups"
+    
+    def getQuery(self, parameters):
+        return Resource.query()
+    
+    def processBatch(self, resources, parameters):
+        """ Queues the rollup updates of every date with current or archived reservations for a batch of resources """
+        for resource in resources:
+            resourceID = resource.id
+            canonicalKey = ndb.Key(Resource, resourceID)
+            reservationDates = set(reservation.date for reservation in 
+                                   Reservation.query(ancestor=canonicalKey).iter(projection=[Reservation.date]))
+            reservationDates.update(reservation.date for reservation in 
+                                    ArchivedReservation.query(ancestor=canonicalKey).iter(projection=[ArchivedReservation.date]))
+            reservationDates = sorted(reservationDates)
+            for batchStart in range(0, len(reservationDates), USAGE_REBUILD_DATES_PER_TASK):
+                enqueueUsageRollupUpdate(resourceID, reservationDates[batchStart:batchStart + USAGE_REBUILD_DATES_PER_TASK])
+        logging.info("Queued usage rollup updates of " + str(len(resources)) + " resources")
+               
+class BackfillResourceOwners(CursorChainedMigration):
+    url = '/admin/backfillResourceOwners'
+    
+    def getStartMessage(self, parameters):
+        return "Started backfilling the resource owners of reservations"
+    
+    def getQuery(self, parameters):
+        return Reservation.query()
+    
+    def processBatch(self, reservations, parameters):
+        """ Stores the owner of the reserved resource on the reservations of a batch stored before it was denormalized """
+        reservations = [reservation for reservation in reservations if reservation.resourceOwnerID is None]
+        resourceOwnerIDs = getResourceOwnerIDs(reservations)
+        for reservation in reservations:
+            reservation.resourceOwnerID = resourceOwnerIDs[reservation.reservationID]
+        ndb.put_multi([reservation for reservation in reservations if reservation.resourceOwnerID])
+        logging.info("Backfilled the resource owners of " + str(len(reservations)) + " reservations")
+               
+class MigrateAvatars(CursorChainedMigration):
+    url = '/admin/migrateAvatars'
+    
+    def getStartMessage(self, parameters):
+        return "Started migrating avatars"
+    
+    def getQuery(self, parameters):
+        return Resource.query()
+    
+    def processBatch(self, resources, parameters):
+        """ Moves the avatars stored inline on a batch of resources to separately stored images """
+        migratedResources = []
+        for resource in resources:
+            if resource.avatar:
+                resource.avatarThumbnails = [AvatarThumbnail(size=DEFAULT_AVATAR_SIZE, imageHash=storeImage(resource.avatar))]
+                resource.avatar = None
+                migratedResources.append(resource)
+        ndb.put_multi(migratedResources)
+        logging.info("Migrated avatars of " + str(len(migratedResources)) + " resources")
+               
+application = InstrumentationMiddleware(webapp2.WSGIApplication([
     ('/', LandingPage),
     ('/userPage', UserPage),
     ('/createResource', CreateResource),
     ('/resourcePage', ResourcePage),
     ('/editResource', EditResource),
     ('/createReservation', CreateReservation),
+    ('/createBulkReservation', CreateBulkReservation),
+    ('/freeSlots', FreeSlots),
+    ('/resourceUsage', ResourceUsage),
+    ('/ownerConsole', OwnerConsole),
     ('/viewReservations',ViewReservations),
     ('/deleteReservation', DeleteReservation),  
     ('/tagPage', TagPage),
@@ -746,5 +2627,18 @@ application = webapp2.WSGIApplication([
     ('/searchName', SearchName),
     ('/sendMailViaCron', SendMailViaCron),
     ('/getImage', GetImage),
-    ('/searchByAvailability', SearchByAvailability)   
-], debug=True)
\ No newline at end of file
+    ('/searchByAvailability', SearchByAvailability),
+    ('/admin/resaveEntities', ResaveEntities),
+    ('/admin/cacheStatistics', CacheStatistics),
+    ('/admin/rekeyEntities', RekeyEntities),
+    ('/admin/rebuildTagCounts', RebuildTagCounts),
+    ('/tasks/deliverMail', DeliverMail),
+    ('/tasks/sweepDashboards', SweepDashboards),
+    ('/tasks/updateDashboard', UpdateDashboard),
+    ('/tasks/archiveReservations', ArchiveReservations),
+    ('/tasks/updateUsageRollups', UpdateUsageRollups),
+    ('/admin/rebuildUsageRollups', RebuildUsageRollups),
+    ('/admin/backfillResourceOwners', BackfillResourceOwners),
+    ('/admin/migrateAvatars', MigrateAvatars),
+    ('/admin/requestStatistics', RequestStatistics)
+], debug=True))
\ No newline at end of file
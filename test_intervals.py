@@ -0,0 +1,69 @@
+""" Randomized comparison of IntervalIndex with the branch-by-branch overlap check it replaced in
+checkClashWithOtherReservationsOfUser """
+import random
+import unittest
+
+from intervals import IntervalIndex, buildIntervalIndexes, intervalsOverlap
+
+def overlapsByBranches(reservationStartMinutes, reservationEndMinutes, requestedStartMinutes, requestedEndMinutes):
+    """ The overlap check of checkClashWithOtherReservationsOfUser before the interval index was introduced """
+    if reservationStartMinutes == requestedStartMinutes:
+        return True
+    elif reservationStartMinutes < requestedStartMinutes:
+        if reservationEndMinutes > requestedStartMinutes:
+            return True
+    elif reservationStartMinutes > requestedStartMinutes:
+        if reservationStartMinutes < requestedEndMinutes:
+            return True
+    return False
+
+def generateInterval(randomGenerator):
+    """ Returns a random interval of minutes within a day, which may be empty """
+    start = randomGenerator.randrange(0, 24*60, 15)
+    return start, start + randomGenerator.randrange(0, 4*60 + 1, 15)
+
+class IntervalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.randomGenerator = random.Random(23)
+
+    def assertMatchesBranches(self, index, intervals, start, end):
+        expectedValues = [value for intervalStart, intervalEnd, value in sorted(intervals, key=lambda interval: interval[:2])
+                          if overlapsByBranches(intervalStart, intervalEnd, start, end)]
+        self.assertEqual(sorted(index.findOverlapping(start, end)), sorted(expectedValues))
+        self.assertEqual(index.overlaps(start, end), bool(expectedValues))
+
+    def testIntervalsOverlapMatchesBranches(self):
+        for trial in range(5000):
+            first, second = generateInterval(self.randomGenerator), generateInterval(self.randomGenerator)
+            self.assertEqual(intervalsOverlap(first[0], first[1], second[0], second[1]),
+                             overlapsByBranches(first[0], first[1], second[0], second[1]))
+
+    def testBuiltIndexMatchesBranches(self):
+        for trial in range(500):
+            intervals = [generateInterval(self.randomGenerator) + (value,) for value in range(self.randomGenerator.randrange(30))]
+            index = IntervalIndex(intervals)
+            self.assertEqual(len(index), len(intervals))
+            for query in range(20):
+                self.assertMatchesBranches(index, intervals, *generateInterval(self.randomGenerator))
+
+    def testIncrementallyBuiltIndexMatchesBranches(self):
+        for trial in range(200):
+            index = IntervalIndex()
+            intervals = []
+            for value in range(self.randomGenerator.randrange(30)):
+                intervals.append(generateInterval(self.randomGenerator) + (value,))
+                index.add(*intervals[-1])
+                self.assertMatchesBranches(index, intervals, *generateInterval(self.randomGenerator))
+
+    def testIndexesAreBuiltPerKey(self):
+        keyedIntervals = [(self.randomGenerator.choice('ab'),) + generateInterval(self.randomGenerator) + (value,)
+                          for value in range(50)]
+        indexes = buildIntervalIndexes(keyedIntervals)
+        for key, index in indexes.items():
+            intervals = [(start, end, value) for intervalKey, start, end, value in keyedIntervals if intervalKey == key]
+            for query in range(20):
+                self.assertMatchesBranches(index, intervals, *generateInterval(self.randomGenerator))
+
+if __name__ == '__main__':
+    unittest.main()
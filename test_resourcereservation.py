@@ -0,0 +1,276 @@
+""" Tests of resourcereservation against the App Engine testbed. They are skipped when the App Engine SDK,
+passed with the APPENGINE_SDK environment variable, is not available """
+import json
+import os
+import random
+import threading
+import time
+import unittest
+
+import benchmark
+
+try:
+    benchmark.configureAppEngineSdk(os.environ.get('APPENGINE_SDK'))
+    from google.appengine.api import datastore_errors
+    from google.appengine.ext import ndb
+    import resourcereservation as app
+except ImportError:
+    app = None
+
+@unittest.skipIf(app is None, "the App Engine SDK is not available")
+class TestbedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = benchmark.activateTestbed()
+        benchmark.signIn(self.testbed, 'owner')
+        ndb.get_context().clear_cache()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def storeResource(self, resourceID='room', key=None, **properties):
+        """ Stores a resource with the requested ID, under the key named after the ID unless another key is given """
+        values = dict(resourceName='Room', ownerID='owner', availableStartTime='8:00', availableEndTime='20:00', capacity=1)
+        values.update(properties)
+        resource = app.Resource(key=key or ndb.Key(app.Resource, resourceID), **values)
+        resource.id = resourceID
+        resource.put()
+        return resource
+
+    def buildReservation(self, reservationID='first', resourceID='room', reservationDate='2030-01-07', startTime='9:0',
+                         durationHours=1, key=None, **properties):
+        """ Returns a reservation of the resource with the requested ID, which has not been stored yet """
+        values = dict(resourceName='Room', ownerID='user', ownerEmail='user@example.com')
+        values.update(properties)
+        return app.Reservation(key=key or app.getReservationKey(resourceID, reservationID), reservationID=reservationID,
+                               resourceID=resourceID, date=app.formatOnlyDate(str(reservationDate)).date(),
+                               startTime=startTime, duration=str(durationHours) + ':0',
+                               endTime=app.calculateEndTimeArray(startTime.split(':'), [str(durationHours), '0']), **values)
+
+class CreateResourceTest(TestbedTestCase):
+
+    def testResourceIsStoredUnderItsID(self):
+        benchmark.sendRequest('/createResource', {'resourceName': 'Meeting Room', 'availableStartTime': '8:00',
+                                                  'availableEndTime': '20:00', 'tags': 'quiet', 'capacity': '2',
+                                                  'description': ''})
+        resource = app.Resource.query().get()
+        self.assertEqual(resource.key, ndb.Key(app.Resource, resource.id))
+        self.assertEqual(app.getResourceByResourceID(resource.id), resource)
+
+class UsageRollupTest(TestbedTestCase):
+
+    def testRollupOfResourceStoredUnderAllocatedID(self):
+        self.storeResource('legacy', key=ndb.Key(app.Resource, 42), resourceName='Projector')
+        reservation = self.buildReservation(resourceID='legacy')
+        reservation.put()
+        app.updateUsageRollups('legacy', [reservation.date])
+        rollup = app.getUsageRollupKey('legacy', 'day', reservation.date).get()
+        self.assertEqual(rollup.resourceName, 'Projector')
+        self.assertEqual(rollup.reservedMinutes, 60)
+
+class DashboardTest(TestbedTestCase):
+
+    def testBookingReachesDashboardThroughTransactionalTask(self):
+        resource = self.storeResource()
+        app.buildUserDashboard('user')
+        app.bookReservation(self.buildReservation(), resource)
+        for task in self.testbed.get_stub('taskqueue').get_filtered_tasks(url='/tasks/updateDashboard'):
+            app.webapp2.Request.blank(task.url, POST=task.payload, headers={
+                'Content-Type': 'application/x-www-form-urlencoded'}).get_response(app.application)
+        dashboard = ndb.Key(app.UserDashboard, 'user').get()
+        self.assertEqual([reservationSummary.reservationID for reservationSummary in dashboard.reservations], ['first'])
+
+    def testFirstBuildKeepsADashboardStoredMeanwhile(self):
+        storedDashboard = app.buildUserDashboard('user')
+        self.assertEqual(app.buildUserDashboard('user').builtTime, storedDashboard.builtTime)
+
+class TemplateInstrumentationTest(TestbedTestCase):
+
+    def testNestedRenderingIsRecordedOnce(self):
+        clock = iter(range(100))
+        originalTime = app.time.time
+        app.time.time = lambda: next(clock)
+        app.REQUEST_STATISTICS.current = {'templateMilliseconds': 0.0}
+        try:
+            inner = app.JINJA_ENVIRONMENT.from_string(u'inner')
+            outer = app.JINJA_ENVIRONMENT.from_string(u'{{ renderInner() }}')
+            self.assertEqual(outer.render(renderInner=inner.render), u'inner')
+            self.assertEqual(app.REQUEST_STATISTICS.current['templateMilliseconds'], 3000)
+        finally:
+            app.time.time = originalTime
+            app.REQUEST_STATISTICS.current = None
+
+class ConcurrentBookingTest(TestbedTestCase):
+
+    def testInterleavedBookingsNeverExceedCapacity(self):
+        resource = self.storeResource(availableStartTime='0:00', availableEndTime='23:59', capacity=2)
+        reservationDate = app.formatOnlyDate('2030-01-07').date()
+        randomGenerator = random.Random(7)
+        requestedSlots = [(randomGenerator.randrange(8, 12), randomGenerator.randrange(1, 3)) for index in range(40)]
+        errors = []
+
+        def book(index):
+            startHour, durationHours = requestedSlots[index]
+            startTime, endTime = str(startHour) + ':0', str(startHour + durationHours) + ':0'
+            try:
+                if app.hasResourceReachedCapacity('room', str(reservationDate), startTime, endTime, resource.capacity):
+                    return
+                reservation = self.buildReservation(str(index), reservationDate=reservationDate, startTime=startTime,
+                                                    durationHours=durationHours, ownerID='user' + str(index))
+                app.bookReservation(reservation, resource)
+            except datastore_errors.TransactionFailedError:
+                pass
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=book, args=(index,)) for index in range(len(requestedSlots))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        ndb.get_context().clear_cache()
+        reservationMinutes = [app.getReservationMinutes(reservation) for reservation in
+                              app.Reservation.query(ancestor=ndb.Key(app.Resource, 'room')).fetch()]
+        self.assertTrue(reservationMinutes)
+        for minute in range(24*60):
+            self.assertLessEqual(sum(1 for start, end in reservationMinutes if start <= minute < end), resource.capacity)
+        occupancy = app.getResourceDayOccupancyKey('room', reservationDate).get()
+        self.assertEqual(occupancy.startMinutes, sorted(start for start, end in reservationMinutes))
+        self.assertEqual(occupancy.endMinutes, sorted(end for start, end in reservationMinutes))
+
+class ReminderDispatchTest(TestbedTestCase):
+
+    def testDueRemindersAreQueuedBeforeTheDispatcherAdvances(self):
+        currentMinute = app.getCurrentDateTime().replace(second=0, microsecond=0)
+        reservation = self.buildReservation(reservationDate=currentMinute.date(), startTime=currentMinute.strftime('%H:%M'))
+        reservation.put()
+        app.createReservationReminders([reservation])
+        benchmark.sendRequest('/sendMailViaCron')
+        self.assertEqual(len(self.testbed.get_stub('taskqueue').get_filtered_tasks(queue_names='mail')), 1)
+        self.assertIsNone(app.getReservationReminderKey(reservation).get())
+        state = ndb.Key(app.ReminderDispatcherState, app.REMINDER_DISPATCHER_ID).get()
+        self.assertGreaterEqual(state.lastDispatchedMinute, currentMinute)
+
+    def testRemindersDueBeforeTheCatchUpWindowAreDeleted(self):
+        reservation = self.buildReservation(reservationDate='2020-01-07')
+        reservation.put()
+        app.buildReservationReminder(reservation).put()
+        benchmark.sendRequest('/sendMailViaCron')
+        self.assertEqual(self.testbed.get_stub('taskqueue').get_filtered_tasks(queue_names='mail'), [])
+        self.assertIsNone(app.getReservationReminderKey(reservation).get())
+
+    def testStartedReservationsAreNotScheduled(self):
+        reservation = self.buildReservation(reservationDate='2020-01-07')
+        reservation.put()
+        app.createReservationReminders([reservation])
+        self.assertIsNone(app.getReservationReminderKey(reservation).get())
+
+class BulkReservationTest(TestbedTestCase):
+
+    def testMissingResourceIsRejected(self):
+        response = app.webapp2.Request.blank('/createBulkReservation', POST=[
+            ('slot', '2030-01-07 9:0'), ('duration', '1:0')]).get_response(app.application)
+        self.assertEqual(response.status_int, 400)
+
+    def requestBulkReservation(self, mode):
+        self.storeResource()
+        self.storeResource('hall', resourceName='Hall')
+        self.buildReservation('full', ownerID='other').put()
+        self.buildReservation('elsewhere', 'hall', '2030-01-08', ownerID='owner').put()
+        response = app.webapp2.Request.blank('/createBulkReservation', POST=[
+            ('resourceID', 'room'), ('duration', '1:0'), ('mode', mode), ('slot', '2030-01-07 9:0'),
+            ('slot', '2030-01-08 9:0'), ('slot', '2030-01-09 9:0')]).get_response(app.application)
+        self.assertEqual(response.status_int, 200)
+        return json.loads(response.body)
+
+    def testAllOrNothingBooksNoneWhenASlotClashes(self):
+        result = self.requestBulkReservation('allOrNothing')
+        self.assertEqual(result['booked'], 0)
+        self.assertEqual([slot['outcome'] for slot in result['slots']], ['notBooked', 'clash', 'notBooked'])
+        self.assertEqual(app.Reservation.query(app.Reservation.resourceID == 'room').count(), 1)
+
+    def testBestEffortBooksTheFreeSlots(self):
+        result = self.requestBulkReservation('bestEffort')
+        self.assertEqual(result['booked'], 1)
+        self.assertEqual([slot['outcome'] for slot in result['slots']], ['capacity', 'clash', 'booked'])
+        self.assertEqual(app.Reservation.query(app.Reservation.resourceID == 'room').count(), 2)
+
+    def testTooManyOccurrencesAreRejected(self):
+        request = app.webapp2.Request.blank('/createBulkReservation', POST={
+            'reservationDate': '2030-01-07', 'startTime': '9:0', 'recurrence': 'daily',
+            'occurrences': str(app.BULK_RESERVATION_LIMIT + 1)})
+        self.assertRaises(ValueError, app.getRequestedSlots, request)
+
+class FreeSlotsTest(TestbedTestCase):
+
+    def testMissingResourceIsRejected(self):
+        response = app.webapp2.Request.blank('/freeSlots?startDate=2030-01-07').get_response(app.application)
+        self.assertEqual(response.status_int, 400)
+
+class RSSFeedTest(TestbedTestCase):
+
+    def requestFeed(self, headers=None):
+        return app.webapp2.Request.blank('/rssPage?value=room', headers=headers or {}).get_response(app.application)
+
+    def testDeletionChangesLastModified(self):
+        self.storeResource(lastReservationTime=app.datetime.now())
+        reservation = self.buildReservation()
+        reservation.put()
+        lastModified = self.requestFeed().headers['Last-Modified']
+        self.assertEqual(self.requestFeed({'If-Modified-Since': lastModified}).status_int, 304)
+        time.sleep(1)
+        app.deleteReservation(reservation)
+        response = self.requestFeed({'If-Modified-Since': lastModified})
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['Last-Modified'], lastModified)
+
+class DeleteReservationTest(TestbedTestCase):
+
+    def testReservationStoredBeforeRekeyingIsDeleted(self):
+        self.storeResource()
+        reservation = self.buildReservation(key=ndb.Key(app.Reservation, 'first'))
+        reservation.put()
+        app.createReservationReminders([reservation])
+        app.deleteReservation(reservation)
+        self.assertIsNone(reservation.key.get())
+        self.assertIsNone(app.getReservationReminderKey(reservation).get())
+
+class SearchTest(TestbedTestCase):
+
+    def testPagesHoldEachMatchingResourceOnceInRankOrder(self):
+        for index, resourceName in enumerate(['Rook Roost Room', 'Room', 'Roof Rooftop', 'Broom', 'Room Annex', 'Rooms Roost']):
+            self.storeResource(str(index), resourceName=resourceName)
+        resourceNames = []
+        offset = 0
+        while offset is not None:
+            resources, offset = app.searchResourcesByName('room', offset, 2)
+            resourceNames.extend(resource.resourceName for resource in resources)
+        self.assertEqual(resourceNames, ['Room', 'Room Annex', 'Rooms Roost', 'Rook Roost Room'])
+
+class MigrationTest(TestbedTestCase):
+
+    def testBatchesAreChainedByCursor(self):
+        self.storeResource()
+        ndb.put_multi([self.buildReservation(str(index)) for index in range(app.MIGRATION_BATCH_SIZE + 1)])
+        taskqueueStub = self.testbed.get_stub('taskqueue')
+        benchmark.sendRequest('/admin/backfillResourceOwners', {})
+        tasks = taskqueueStub.get_filtered_tasks(url='/admin/backfillResourceOwners')
+        self.assertEqual(len(tasks), 1)
+        benchmark.sendRequest('/admin/backfillResourceOwners', {'cursor': tasks[0].extract_params()['cursor']})
+        self.assertEqual(len(taskqueueStub.get_filtered_tasks(url='/admin/backfillResourceOwners')), 1)
+        self.assertEqual(set(reservation.resourceOwnerID for reservation in app.Reservation.query()), set(['owner']))
+
+class RekeyTest(TestbedTestCase):
+
+    def testRekeyedReservationsAreCountedTowardsCapacity(self):
+        resource = self.storeResource()
+        legacyReservation = self.buildReservation(key=ndb.Key(app.Reservation, 'first'))
+        legacyReservation.put()
+        self.assertIsNotNone(app.bookReservation(self.buildReservation('second', startTime='12:0'), resource))
+        benchmark.sendRequest('/admin/rekeyEntities', {'kind': 'Reservation'})
+        self.assertIsNone(app.bookReservation(self.buildReservation('third'), resource))
+
+if __name__ == '__main__':
+    unittest.main()